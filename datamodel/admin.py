@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
-from datamodel.models import Game, Move
+from datamodel.models import ArchivedGame, Game, Move, UserStats
 
 # Register your models here.
 #
@@ -16,6 +16,8 @@ from datamodel.models import Game, Move
 # Register your models here.
 admin.site.register(Game)
 admin.site.register(Move)
+admin.site.register(ArchivedGame)
+admin.site.register(UserStats)
 # admin.site.register(Category, CategoryAdmin)
 # admin.site.register(Page, PageAdmin)
 # admin.site.register(UserProfile)
@@ -0,0 +1,45 @@
+"""
+Archival of finished games.
+
+FINISHED games and their moves are moved out of Game and Move, which the
+live views query, into one ArchivedGame row per game that keeps the packed
+move log. Each batch is archived in its own transaction, so the process
+can be stopped at any point and simply run again to resume.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from datamodel.models import ArchivedGame, Game, GameStatus
+
+
+def archive_batch(after=0, size=500, days=0):
+    """
+    Archives up to 'size' FINISHED games with id greater than 'after'
+    whose last move is at least 'days' days old. Returns (number of games
+    archived, id to pass as 'after' for the next batch); that id is None
+    when no games are left.
+    """
+    cutoff = datetime.date.today() - datetime.timedelta(days=days)
+    games = Game.objects.filter(status=GameStatus.FINISHED, id__gt=after)\
+                        .annotate(last_move=Max('move__date'))\
+                        .filter(Q(last_move__isnull=True) |
+                                Q(last_move__lte=cutoff))\
+                        .order_by('id')\
+                        .only('id', 'cat_user', 'mouse_user', 'winner',
+                              'move_log', 'start')
+    with transaction.atomic():
+        games = list(games[:size])
+        if not games:
+            return 0, None
+        ArchivedGame.objects.bulk_create(
+            ArchivedGame(id=game.id, cat_user_id=game.cat_user_id,
+                         mouse_user_id=game.mouse_user_id,
+                         winner=game.winner, move_log=bytes(game.move_log),
+                         start=game.start,
+                         finished=game.last_move or datetime.date.today())
+            for game in games)
+        # Move rows go with their games through the cascade
+        Game.objects.filter(id__in=[game.id for game in games]).delete()
+    return len(games), games[-1].id
@@ -0,0 +1,139 @@
+"""
+Offline validation of whole move sequences with NumPy.
+
+Many games are checked at once: their plies are laid out as
+(games x plies) arrays and the rules of datamodel.board are applied to
+every game in a single vectorized step per ply, with cats kept as uint64
+bitboards. Nothing touches the database, so stored, imported or replayed
+games can be audited in bulk without Move.save().
+"""
+import numpy as np
+
+from datamodel import board, movelog
+from datamodel.replay import START, Position
+
+ONE = np.uint64(1)
+FULL = np.uint64(board.FULL)
+NOT_COL_A = np.uint64(board.NOT_COL_A)
+NOT_COL_H = np.uint64(board.NOT_COL_H)
+CAT_STEP_MASKS = np.array(board.CAT_STEP_MASKS, dtype=np.uint64)
+MOUSE_STEP_MASKS = np.array(board.MOUSE_STEP_MASKS, dtype=np.uint64)
+DARK_CELLS = np.array(board.DARK_CELLS, dtype=np.int64)
+DIRECTIONS = np.array(movelog.DIRECTIONS, dtype=np.int64)
+
+
+def pack_logs(logs):
+    """
+    (codes, lengths) for a sequence of move logs (Game.move_log values):
+    'codes' is a (games x longest log) uint8 array padded with zeros and
+    'lengths' the number of plies of each game.
+    """
+    logs = [bytes(log or b'') for log in logs]
+    lengths = np.array([len(log) for log in logs], dtype=np.int64)
+    codes = np.zeros((len(logs), int(lengths.max()) if len(logs) else 0),
+                     dtype=np.uint8)
+    if lengths.sum():
+        rows = np.repeat(np.arange(len(logs)), lengths)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        cols = np.arange(int(lengths.sum())) - starts
+        codes[rows, cols] = np.frombuffer(b''.join(logs), dtype=np.uint8)
+    return codes, lengths
+
+
+def decode(codes):
+    """ (cat, origin, target) arrays of movelog 'codes', see movelog """
+    codes = np.asarray(codes, dtype=np.uint8)
+    cat = (codes & movelog.CAT_FLAG) != 0
+    origin = DARK_CELLS[(codes >> 2) & 0x1F]
+    return cat, origin, origin + DIRECTIONS[codes & 3]
+
+
+def unpack_starts(keys):
+    """
+    replay.unpack() of an array of Game.start values, as a Position of
+    arrays for first_illegal()
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    dark = (keys >> 6).astype(np.uint64)
+    cats = np.zeros(len(keys), dtype=np.uint64)
+    for index, cell in enumerate(board.DARK_CELLS):
+        cats |= ((dark >> np.uint64(index)) & ONE) << np.uint64(cell)
+    return Position(cats, DARK_CELLS[(keys >> 1) & 0x1F], (keys & 1) != 0)
+
+
+def _cat_steps(cats):
+    return ((cats & NOT_COL_A) << np.uint64(board.WIDTH - 1)) |\
+        ((cats & NOT_COL_H) << np.uint64(board.WIDTH + 1))
+
+
+def _game_over(cats, mouse, cat_turn):
+    """ board.winner(...) is not None, for arrays of positions """
+    low = cats & (~cats + ONE)
+    with np.errstate(divide='ignore'):
+        top_row = np.log2(low.astype(np.float64)) // board.WIDTH
+    escaped = (cats == 0) | (mouse // board.WIDTH <= top_row)
+    blocked = cats | (ONE << mouse.astype(np.uint64))
+    cats_stuck = (_cat_steps(cats) & ~blocked & FULL) == 0
+    mouse_stuck = (MOUSE_STEP_MASKS[mouse] & ~cats) == 0
+    return escaped | np.where(cat_turn, cats_stuck, mouse_stuck)
+
+
+def first_illegal(cat, origin, target, lengths, start=START):
+    """
+    Number (from 1, as Move.ply) of the first illegal ply of each game, or
+    0 if all its plies are legal. 'cat', 'origin' and 'target' are
+    (games x plies) arrays, 'lengths' the plies of each game and 'start'
+    the replay.Position every game starts from, or a Position of arrays
+    with the start of each game (see unpack_starts).
+    A ply is illegal if it is played by the side not on turn, after the
+    game is over, or breaks the move rules of board.valid_cat_move and
+    board.valid_mouse_move.
+    """
+    cat = np.asarray(cat, dtype=bool)
+    origin = np.asarray(origin, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n_games = len(lengths)
+    cats = np.broadcast_to(np.asarray(start.cats, dtype=np.uint64),
+                           n_games).copy()
+    mouse = np.broadcast_to(np.asarray(start.mouse, dtype=np.int64),
+                            n_games).copy()
+    cat_turn = np.broadcast_to(np.asarray(start.cat_turn, dtype=bool),
+                               n_games).copy()
+    result = np.zeros(n_games, dtype=np.int64)
+
+    for ply in range(origin.shape[1] if origin.ndim == 2 else 0):
+        live = (ply < lengths) & (result == 0)
+        if not live.any():
+            break
+        c, o, t = cat[:, ply], origin[:, ply], target[:, ply]
+        on_board = (o >= board.MIN_CELL) & (o <= board.MAX_CELL) &\
+            (t >= board.MIN_CELL) & (t <= board.MAX_CELL)
+        o = np.clip(o, board.MIN_CELL, board.MAX_CELL)
+        t = np.clip(t, board.MIN_CELL, board.MAX_CELL)
+        origin_bb = ONE << o.astype(np.uint64)
+        target_bb = ONE << t.astype(np.uint64)
+        free = (cats & target_bb) == 0
+        cat_ok = ((cats & origin_bb) != 0) & free & (t != mouse) &\
+            ((CAT_STEP_MASKS[o] & target_bb) != 0)
+        mouse_ok = (o == mouse) & free &\
+            ((MOUSE_STEP_MASKS[o] & target_bb) != 0)
+        legal = on_board & (c == cat_turn) &\
+            ~_game_over(cats, mouse, cat_turn) &\
+            np.where(c, cat_ok, mouse_ok)
+        result[live & ~legal] = ply + 1
+
+        play = live & legal
+        cats = np.where(play & c, cats ^ origin_bb ^ target_bb, cats)
+        mouse = np.where(play & ~c, t, mouse)
+        cat_turn = np.where(play, ~cat_turn, cat_turn)
+    return result
+
+
+def first_illegal_logs(logs, start=START):
+    """
+    first_illegal() of a sequence of Game.move_log values, played from
+    'start' (a Position, or a Position of arrays with one item per log)
+    """
+    codes, lengths = pack_logs(logs)
+    return first_illegal(*decode(codes), lengths, start=start)
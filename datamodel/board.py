@@ -0,0 +1,217 @@
+"""
+Bitboard engine for the Mouse & Cats board.
+
+Cells are numbered 0..63 row by row (cell = row * WIDTH + col). A set of
+cells is represented as an integer mask where bit N stands for cell N, so
+membership tests and move generation are plain shift-and-mask operations
+and never allocate intermediate lists.
+"""
+import random
+
+WIDTH = 8
+BOARD_SIZE = WIDTH * WIDTH
+MIN_CELL = 0
+MAX_CELL = BOARD_SIZE - 1
+
+FULL = (1 << BOARD_SIZE) - 1
+
+# Sides, as reported by winner()
+CAT = 0
+MOUSE = 1
+
+# 64-bit Zobrist keys. The seed is fixed so that hashes are stable across
+# processes and can be stored.
+_zobrist_rng = random.Random(0x4D6F75736543617473)
+ZOBRIST_CAT = tuple(_zobrist_rng.getrandbits(64)
+                    for _ in range(BOARD_SIZE))
+ZOBRIST_MOUSE = tuple(_zobrist_rng.getrandbits(64)
+                      for _ in range(BOARD_SIZE))
+ZOBRIST_CAT_TURN = _zobrist_rng.getrandbits(64)
+
+# Column masks used to stop diagonal shifts from wrapping around the board
+COL_A = sum(1 << (row * WIDTH) for row in range(WIDTH))
+COL_H = COL_A << (WIDTH - 1)
+NOT_COL_A = FULL ^ COL_A
+NOT_COL_H = FULL ^ COL_H
+
+# Playable squares: row and column share parity (0, 2, 4, 6, 9, 11...)
+DARK = sum(1 << cell for cell in range(BOARD_SIZE)
+           if (cell // WIDTH) % 2 == (cell % WIDTH) % 2)
+DARK_CELLS = tuple(cell for cell in range(BOARD_SIZE) if DARK >> cell & 1)
+# Position of each cell in DARK_CELLS, -1 for light cells
+DARK_INDEX = tuple(DARK_CELLS.index(cell) if DARK >> cell & 1 else -1
+                   for cell in range(BOARD_SIZE))
+
+
+def in_board(cell):
+    return MIN_CELL <= cell <= MAX_CELL
+
+
+def bit(cell):
+    return 1 << cell
+
+
+def cells_mask(*cells):
+    mask = 0
+    for cell in cells:
+        mask |= 1 << cell
+    return mask
+
+
+def is_dark(cell):
+    return in_board(cell) and bool(DARK >> cell & 1)
+
+
+def cat_steps(mask):
+    """ Cells reachable by a forward (south) diagonal step from 'mask' """
+    return (((mask & NOT_COL_A) << (WIDTH - 1)) |
+            ((mask & NOT_COL_H) << (WIDTH + 1))) & FULL
+
+
+def mouse_steps(mask):
+    """ Cells reachable by a diagonal step in any direction from 'mask' """
+    return cat_steps(mask) |\
+        ((mask & NOT_COL_A) >> (WIDTH + 1)) |\
+        ((mask & NOT_COL_H) >> (WIDTH - 1))
+
+
+def mask_cells(mask):
+    """ Tuple of the cells set in 'mask', in increasing order """
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return tuple(cells)
+
+
+# Per-cell step tables, built once at import. *_STEP_MASKS[cell] is the
+# mask of diagonal neighbours and *_MOVES[cell] the same cells as a tuple.
+CAT_STEP_MASKS = tuple(cat_steps(1 << cell) for cell in range(BOARD_SIZE))
+MOUSE_STEP_MASKS = tuple(mouse_steps(1 << cell)
+                         for cell in range(BOARD_SIZE))
+CAT_MOVES = tuple(mask_cells(mask) for mask in CAT_STEP_MASKS)
+MOUSE_MOVES = tuple(mask_cells(mask) for mask in MOUSE_STEP_MASKS)
+
+
+def cat_moves(cats, mouse):
+    """ List of (origin, target) pairs available to the cats """
+    blocked = cats | (1 << mouse)
+    moves = []
+    for origin in mask_cells(cats):
+        if CAT_STEP_MASKS[origin] & ~blocked:
+            for target in CAT_MOVES[origin]:
+                if not blocked >> target & 1:
+                    moves.append((origin, target))
+    return moves
+
+
+def mouse_moves(cats, mouse):
+    """ List of (origin, target) pairs available to the mouse """
+    return [(mouse, target) for target in MOUSE_MOVES[mouse]
+            if not cats >> target & 1]
+
+
+def zobrist(cats, mouse, cat_turn):
+    """ Zobrist hash of the cat set, the mouse cell and the side to move """
+    key = ZOBRIST_MOUSE[mouse]
+    if cat_turn:
+        key ^= ZOBRIST_CAT_TURN
+    for cell in mask_cells(cats):
+        key ^= ZOBRIST_CAT[cell]
+    return key
+
+
+def canonical_key(cats, mouse, cat_turn):
+    """
+    Integer key of a position that does not depend on which of the four
+    cats stands on each cell: the cats are taken as a set (their mask),
+    followed by the mouse cell and the side to move.
+    Left-right mirroring is deliberately not folded in. Playable cells are
+    those whose row and column share parity, so the mirror image of any
+    reachable position lies on the other colour and never matches another
+    reachable position.
+    """
+    return (cats << 7) | (mouse << 1) | bool(cat_turn)
+
+
+def to_signed64(key):
+    """ Zobrist key as stored in a signed 64-bit database column """
+    return key - (1 << 64) if key >> 63 else key
+
+
+def has_cat_moves(cats, mouse):
+    return bool(cat_steps(cats) & ~(cats | (1 << mouse)) & FULL)
+
+
+def has_mouse_moves(cats, mouse):
+    return bool(MOUSE_STEP_MASKS[mouse] & ~cats)
+
+
+def mouse_escaped(cats, mouse):
+    """
+    True once no cat is left on a row above the mouse: cats only move
+    forward, so none of them can block it any more.
+    """
+    if not cats:
+        return True
+    top_row = ((cats & -cats).bit_length() - 1) // WIDTH
+    return mouse // WIDTH <= top_row
+
+
+def winner(cats, mouse, cat_turn):
+    """
+    Winner of the position with the given side to move (CAT or MOUSE), or
+    None if the game goes on.
+    """
+    if mouse_escaped(cats, mouse):
+        return MOUSE
+    if cat_turn:
+        if not has_cat_moves(cats, mouse):
+            return MOUSE
+    elif not has_mouse_moves(cats, mouse):
+        return CAT
+    return None
+
+
+def valid_cat_move(cats, mouse, origin, target):
+    """
+    True if a cat standing on 'origin' may step into 'target', given the
+    cats mask and the mouse cell.
+    """
+    if not in_board(origin) or not in_board(target):
+        return False
+    origin_bb = 1 << origin
+    target_bb = 1 << target
+    if not cats & origin_bb or cats & target_bb:
+        return False
+    if target == mouse:
+        return False
+    return bool(CAT_STEP_MASKS[origin] & target_bb)
+
+
+def valid_mouse_move(cats, mouse, origin, target):
+    """
+    True if the mouse standing on 'origin' may step into 'target', given
+    the cats mask and the mouse cell.
+    """
+    if not in_board(origin) or not in_board(target):
+        return False
+    if origin != mouse:
+        return False
+    target_bb = 1 << target
+    if cats & target_bb:
+        return False
+    return bool(MOUSE_STEP_MASKS[origin] & target_bb)
+
+
+def to_list(cats, mouse):
+    """
+    Board as the 64-integer list used by the templates: 1 for a cat, -1
+    for the mouse and 0 for an empty cell.
+    """
+    board = [0] * BOARD_SIZE
+    board[mouse] = -1
+    for cell in mask_cells(cats):
+        board[cell] = 1
+    return board
@@ -0,0 +1,100 @@
+"""
+Computer players.
+
+A bot is a regular User whose username appears in settings.MOUSE_CAT_BOTS,
+mapped to the name of the engine that plays for it. Bots join games as the
+mouse through Game.objects.join_pending(), exactly like join_game, and
+answer as soon as a human move leaves them on turn.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from datamodel import tablebase
+from datamodel.mcts import MonteCarlo
+from datamodel.models import Game, GameStatus, Move
+from datamodel.search import AlphaBeta
+
+ENGINES = {
+    'alphabeta': lambda: AlphaBeta(max_time=settings.BOT_MOVE_TIME),
+    'mcts': lambda: MonteCarlo(max_time=settings.BOT_MOVE_TIME,
+                               workers=settings.MCTS_WORKERS),
+}
+
+logger = logging.getLogger(__name__)
+
+# One engine per bot and thread: search tables survive between moves, and
+# requests served at the same time never share an engine's search state
+_local = threading.local()
+
+
+def is_bot(user):
+    return user is not None and user.username in settings.MOUSE_CAT_BOTS
+
+
+def get_bot_user(username):
+    user, created = User.objects.get_or_create(username=username)
+    if created:
+        user.set_unusable_password()
+        user.save()
+    return user
+
+
+def get_engine(username):
+    if not hasattr(_local, 'engines'):
+        _local.engines = {}
+    if username not in _local.engines:
+        _local.engines[username] =\
+            ENGINES[settings.MOUSE_CAT_BOTS[username]]()
+    return _local.engines[username]
+
+
+def choose_move(game, username):
+    """
+    Move the bot 'username' plays in 'game': straight from the tablebase
+    when one has been generated, otherwise from its engine.
+    """
+    table = tablebase.get_tablebase()
+    if table is not None:
+        move = table.best_move(game)
+        if move is not None:
+            return move
+    return get_engine(username).best_move(game)
+
+
+def reply(game):
+    """
+    Plays the bot move if the side to move in 'game' is a bot. Returns the
+    saved Move, or None if there is nothing to play or the game changed
+    under it.
+    """
+    if game.status != GameStatus.ACTIVE:
+        return None
+    player = game.cat_user if game.cat_turn else game.mouse_user
+    if not is_bot(player):
+        return None
+    move = choose_move(game, player.username)
+    if move is None:
+        return None
+    origin, target = move
+    move = Move(origin=origin, target=target, game=game, player=player)
+    try:
+        move.save()
+    except ValidationError as err:
+        # Another reply (a run_bots pass or a request) moved first; the
+        # move that triggered this one is already saved
+        logger.info('Bot reply in game %d skipped: %s', game.id,
+                    err.messages[0])
+        return None
+    return move
+
+
+def pending_replies(user):
+    """ Active games of bot 'user' waiting for its move """
+    return Game.objects.filter(
+        Q(cat_user=user, cat_turn=True) | Q(mouse_user=user, cat_turn=False),
+        status=GameStatus.ACTIVE)
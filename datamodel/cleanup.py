@@ -0,0 +1,97 @@
+"""
+Removal of orphan games.
+
+Orphan games are CREATED games that nobody joined and ACTIVE games where
+nobody moved for a long time. They are deleted in short transactions over
+consecutive id ranges, so no statement locks more than one range of rows.
+"""
+import datetime
+import time
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from datamodel.models import Game, GameStatus, Move, UserStats
+
+DEFAULT_BATCH = 1000
+DEFAULT_CREATED_DAYS = 7
+DEFAULT_ACTIVE_DAYS = 30
+
+
+def orphan_games(created_days=DEFAULT_CREATED_DAYS,
+                 active_days=DEFAULT_ACTIVE_DAYS):
+    """
+    Queryset of CREATED games older than 'created_days' days, and ACTIVE
+    games older than 'active_days' days without moves in that period.
+    """
+    now = timezone.now()
+    created_cutoff = now - datetime.timedelta(days=created_days)
+    active_cutoff = now - datetime.timedelta(days=active_days)
+    recent_moves = Move.objects.filter(game=OuterRef('pk'),
+                                       date__gte=active_cutoff.date())
+    return Game.objects.annotate(recent_moves=Exists(recent_moves))\
+                       .filter(Q(status=GameStatus.CREATED,
+                                 created__lt=created_cutoff) |
+                               Q(status=GameStatus.ACTIVE,
+                                 created__lt=active_cutoff,
+                                 recent_moves=False))
+
+
+def clean_batch(first_id, size=DEFAULT_BATCH,
+                created_days=DEFAULT_CREATED_DAYS,
+                active_days=DEFAULT_ACTIVE_DAYS):
+    """
+    Deletes the orphan games with id in [first_id, first_id + size) and
+    returns how many were deleted. The candidates are locked, skipping
+    rows another transaction is writing (a join_game, a move), and the
+    orphan conditions are checked again by the DELETE itself.
+    """
+    games = orphan_games(created_days, active_days)\
+        .filter(id__gte=first_id, id__lt=first_id + size)
+    if connection.features.has_select_for_update_skip_locked:
+        games = games.select_for_update(skip_locked=True)
+    with transaction.atomic():
+        rows = list(games.values_list('id', *Game.STATS_FIELDS))
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        _, deleted = orphan_games(created_days, active_days)\
+            .filter(id__in=ids).delete()
+        # Without row locks a game may have been joined in between
+        kept = set(Game.objects.filter(id__in=ids)
+                               .values_list('id', flat=True))
+        UserStats.objects.record_all((row[1:], None) for row in rows
+                                     if row[0] not in kept)
+    return deleted.get(Game._meta.label, 0)
+
+
+def clean_db(size=DEFAULT_BATCH, created_days=DEFAULT_CREATED_DAYS,
+             active_days=DEFAULT_ACTIVE_DAYS, sleep=0.0, progress=None,
+             batches=None):
+    """
+    Deletes the orphan games, one id range of 'size' games at a time from
+    the first orphan on, waiting 'sleep' seconds between ranges. With
+    'batches', it stops after that many ranges. 'progress', if given, is
+    called as progress(last id checked, max id, games deleted so far).
+    Returns the number of games deleted.
+    """
+    first_id = orphan_games(created_days, active_days)\
+        .order_by('id').values_list('id', flat=True).first()
+    last_id = Game.objects.filter(status__in=(GameStatus.CREATED,
+                                              GameStatus.ACTIVE))\
+                          .order_by('id').values_list('id', flat=True)\
+                          .last()
+    total = 0
+    if first_id is None:
+        return total
+    end_id = last_id if batches is None else\
+        min(last_id, first_id + batches * size - 1)
+    while first_id <= end_id:
+        total += clean_batch(first_id, size, created_days, active_days)
+        first_id += size
+        if progress:
+            progress(min(first_id - 1, last_id), last_id, total)
+        if sleep and first_id <= end_id:
+            time.sleep(sleep)
+    return total
@@ -2,3 +2,6 @@ GAME_SELECTED_SESSION_ID = 'game_selected'
 ERROR_MESSAGE_ID = 'msg_error'
 COUNTER_SESSION_ID = 'counter'
 BOARD_SIZE = 64
+GAMES_PAGE_SIZE = 20
+HISTORY_PAGE_SIZE = 20
+CLEAN_DB_BATCHES = 10
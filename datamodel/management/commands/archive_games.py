@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from datamodel.archive import archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Moves finished games and their moves to the archive table, ' +\
+           'in batches; it can be interrupted and run again at any time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500,
+                            help='Games archived per transaction')
+        parser.add_argument('--days', type=int, default=7,
+                            help='Only games whose last move is this old')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches')
+        parser.add_argument('--sleep', type=float, default=0.1,
+                            help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        after = 0
+        total = 0
+        batches = 0
+        while options['max_batches'] is None or\
+                batches < options['max_batches']:
+            archived, after = archive_batch(after, options['batch'],
+                                            options['days'])
+            if after is None:
+                break
+            total += archived
+            batches += 1
+            self.stdout.write('Archived %d games (up to id %d)' %
+                              (total, after))
+            time.sleep(options['sleep'])
+        self.stdout.write('%d games archived' % total)
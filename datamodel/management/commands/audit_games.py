@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from datamodel import audit
+from datamodel.models import ArchivedGame, Game
+
+
+class Command(BaseCommand):
+    help = 'Replays the move log of every game, live and archived, and ' +\
+           'reports the first illegal ply of each broken game'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help='Games validated at once')
+
+    def handle(self, *args, **options):
+        checked = 0
+        broken = 0
+        for model in (Game, ArchivedGame):
+            logs = model.objects.order_by('id')\
+                                .values_list('id', 'move_log', 'start')\
+                                .iterator(chunk_size=options['chunk_size'])
+            chunk = []
+            for row in logs:
+                chunk.append(row)
+                if len(chunk) >= options['chunk_size']:
+                    broken += self.audit(model, chunk)
+                    checked += len(chunk)
+                    chunk = []
+            if chunk:
+                broken += self.audit(model, chunk)
+                checked += len(chunk)
+        self.stdout.write('%d games checked, %d with illegal moves' %
+                          (checked, broken))
+
+    def audit(self, model, chunk):
+        starts = audit.unpack_starts([start for _, _, start in chunk])
+        plies = audit.first_illegal_logs([log for _, log, _ in chunk],
+                                         start=starts)
+        broken = 0
+        for (game_id, _, _), ply in zip(chunk, plies):
+            if ply:
+                broken += 1
+                self.stdout.write('%s %d: illegal ply %d' %
+                                  (model.__name__, game_id, ply))
+        return broken
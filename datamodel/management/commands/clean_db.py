@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from datamodel import cleanup
+
+
+class Command(BaseCommand):
+    help = 'Deletes CREATED games nobody joined and ACTIVE games nobody ' +\
+           'plays, in batches by id range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int,
+                            default=cleanup.DEFAULT_BATCH,
+                            help='Width of each id range')
+        parser.add_argument('--created-days', type=int,
+                            default=cleanup.DEFAULT_CREATED_DAYS,
+                            help='Age of the CREATED games to delete')
+        parser.add_argument('--active-days', type=int,
+                            default=cleanup.DEFAULT_ACTIVE_DAYS,
+                            help='Days without moves of the ACTIVE games '
+                                 'to delete')
+        parser.add_argument('--sleep', type=float, default=0.5,
+                            help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        def progress(last_id, max_id, deleted):
+            self.stdout.write('Up to id %d of %d: %d games removed' %
+                              (last_id, max_id, deleted))
+
+        total = cleanup.clean_db(options['batch'], options['created_days'],
+                                 options['active_days'], options['sleep'],
+                                 progress)
+        self.stdout.write('%d games removed from db' % total)
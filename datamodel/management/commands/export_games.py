@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from datamodel import transfer
+from datamodel.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Streams games and their moves to a JSONL or binary file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Output file, '-' for stdout")
+        parser.add_argument('--format', choices=('jsonl', 'binary'),
+                            default='jsonl')
+        parser.add_argument('--status', type=int, action='append',
+                            help='Only games with this status (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        games = Game.objects.all()
+        if options['status']:
+            games = games.filter(status__in=options['status'])
+        records = transfer.export_records(games, options['chunk_size'])
+        binary = options['format'] == 'binary'
+        if options['output'] == '-':
+            stream = sys.stdout.buffer if binary else sys.stdout
+            count = self.write(records, stream, binary)
+        else:
+            with open(options['output'], 'wb' if binary else 'w') as stream:
+                count = self.write(records, stream, binary)
+        self.stderr.write('%d games exported' % count)
+
+    def write(self, records, stream, binary):
+        if binary:
+            return transfer.write_binary(records, stream)
+        return transfer.write_jsonl(records, stream)
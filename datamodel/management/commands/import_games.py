@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from datamodel import transfer
+
+
+class Command(BaseCommand):
+    help = 'Loads games and their moves from a file of export_games'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File written by export_games')
+        parser.add_argument('--batch', type=int, default=1000,
+                            help='Games inserted per transaction')
+
+    def handle(self, *args, **options):
+        def progress(count):
+            self.stdout.write('%d games imported' % count)
+
+        with open(options['input'], 'rb') as stream:
+            binary = transfer.is_binary(stream.read(len(transfer.MAGIC)))
+        if binary:
+            with open(options['input'], 'rb') as stream:
+                transfer.import_records(transfer.read_binary(stream),
+                                        options['batch'], progress)
+        else:
+            with open(options['input']) as stream:
+                transfer.import_records(transfer.read_jsonl(stream),
+                                        options['batch'], progress)
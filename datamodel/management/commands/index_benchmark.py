@@ -0,0 +1,145 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q, UniqueConstraint
+
+from datamodel.models import Game, GameStatus, Move
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Seeds a dataset of games and shows the plans and timings of '
+            'the lobby, selection and history queries with and without '
+            'the indexes and unique constraints of Game and Move. '
+            'Everything is rolled back unless --keep is given; run it '
+            'against a scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1000000,
+                            help='Number of games to seed')
+        parser.add_argument('--users', type=int, default=10000,
+                            help='Number of users to seed')
+        parser.add_argument('--moves', type=int, default=2,
+                            help='Moves seeded per game')
+        parser.add_argument('--open', type=float, default=0.01,
+                            help='Fraction of games waiting for a mouse')
+        parser.add_argument('--batch', type=int, default=10000,
+                            help='Objects built in memory per bulk_create')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the seeded rows')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.benchmark()
+                if not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            self.stdout.write('Seeded rows rolled back')
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        batch = options['batch']
+        start = time.time()
+        User.objects.bulk_create(
+            (User(username='index_benchmark_%d' % i)
+             for i in range(options['users'])))
+        user_ids = list(User.objects.filter(
+            username__startswith='index_benchmark_')
+            .values_list('id', flat=True))
+
+        games = []
+        for _ in range(options['games']):
+            cat_user = rng.choice(user_ids)
+            if rng.random() < options['open']:
+                games.append(Game(cat_user_id=cat_user))
+                continue
+            status = GameStatus.ACTIVE if rng.random() < 0.1 else\
+                GameStatus.FINISHED
+            games.append(Game(cat_user_id=cat_user,
+                              mouse_user_id=rng.choice(user_ids),
+                              status=status))
+            if len(games) >= batch:
+                Game.objects.bulk_create(games)
+                games = []
+        Game.objects.bulk_create(games)
+
+        if options['moves']:
+            moves = []
+            games = Game.objects.exclude(mouse_user=None)\
+                                .values_list('id', 'cat_user_id')\
+                                .iterator(chunk_size=batch)
+            for game_id, cat_user in games:
+                for ply in range(1, options['moves'] + 1):
+                    moves.append(Move(game_id=game_id, player_id=cat_user,
+                                      origin=0, target=9, ply=ply))
+                if len(moves) >= batch:
+                    Move.objects.bulk_create(moves)
+                    moves = []
+            Move.objects.bulk_create(moves)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write('Seeded %d games in %.1fs' %
+                          (Game.objects.count(), time.time() - start))
+
+    def queries(self):
+        game = Game.objects.exclude(mouse_user=None).order_by('id').first()
+        user = game.cat_user_id
+        return [
+            ('lobby', Game.objects.filter(mouse_user=None)
+                .exclude(cat_user=user).order_by('-id')[:1]),
+            ('as cat', Game.objects.filter(cat_user=user,
+                                           status=GameStatus.ACTIVE)),
+            ('as mouse', Game.objects.filter(mouse_user=user,
+                                             status=GameStatus.ACTIVE)),
+            ('selection', Game.objects.filter(
+                Q(cat_user=user) | Q(mouse_user=user),
+                id=game.id, status=GameStatus.ACTIVE)),
+            ('history', Move.objects.filter(game=game.id)
+                .order_by('-ply')[:20]),
+        ]
+
+    def run(self, title):
+        self.stdout.write('\n== %s ==' % title)
+        for name, query in self.queries():
+            start = time.time()
+            list(query)
+            elapsed = time.time() - start
+            self.stdout.write('-- %s: %.2f ms' % (name, elapsed * 1000))
+            self.stdout.write(query.explain())
+
+    def benchmark(self):
+        # Unique constraints are indexes too: move_game_ply_uniq serves the
+        # history query
+        indexes = [(model, index) for model in (Game, Move)
+                   for index in model._meta.indexes +
+                   [c for c in model._meta.constraints
+                    if isinstance(c, UniqueConstraint)]]
+        if connection.vendor == 'sqlite':
+            # SQLite only drops a unique constraint by rebuilding the table
+            indexes = [(model, index) for model, index in indexes
+                       if not isinstance(index, UniqueConstraint)]
+        # The editor is not entered as a context manager: SQLite refuses
+        # that inside a transaction, and these statements need no table
+        # rebuild, so they can be rolled back like any other
+        editor = connection.schema_editor()
+        self.run('with indexes')
+        for model, index in indexes:
+            editor.execute(index.remove_sql(model, editor))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.run('without indexes')
+        if connection.vendor == 'sqlite':
+            self.stdout.write('The unique constraints were kept: history '
+                              'still uses move_game_ply_uniq')
+        for model, index in indexes:
+            editor.execute(index.create_sql(model, editor))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from datamodel.mcts import MonteCarlo
+from datamodel.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Measures MCTS rollouts per second from the initial position'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0,
+                            help='Wall-clock time of each search')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Pool size (all cores by default)')
+        parser.add_argument('--rounds', type=int, default=3,
+                            help='Number of searches to run')
+
+    def handle(self, *args, **options):
+        engine = MonteCarlo(max_time=options['seconds'],
+                            workers=options['workers'])
+        game = Game()
+        for _ in range(options['rounds']):
+            engine.best_move(game)
+            stats = engine.last_stats
+            self.stdout.write(
+                '%d workers: %d rollouts in %.2fs, %.0f rollouts/s' %
+                (stats['workers'], stats['rollouts'], stats['elapsed'],
+                 stats['rollouts_per_second']))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from datamodel import stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-user statistics from every live and ' +\
+           'archived game'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes aggregating the games')
+        parser.add_argument('--chunk', type=int, default=stats.DEFAULT_CHUNK,
+                            help='Game ids aggregated by each query')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write('%d of %d chunks' % (done, total))
+
+        users = stats.rebuild(options['workers'], options['chunk'], progress)
+        self.stdout.write('Statistics of %d users rebuilt' % users)
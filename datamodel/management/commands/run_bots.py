@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from datamodel import bots
+from datamodel.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Lets the computer players join pending games and reply to ' +\
+           'the games waiting for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single pass and exit')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between passes')
+        parser.add_argument('--max-joins', type=int, default=10,
+                            help='Games each bot may join per pass')
+
+    def handle(self, *args, **options):
+        while True:
+            for username in settings.MOUSE_CAT_BOTS:
+                self.run_bot(bots.get_bot_user(username),
+                             options['max_joins'])
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+    def run_bot(self, user, max_joins):
+        for _ in range(max_joins):
+            game = Game.objects.join_pending(user)
+            if game is None:
+                break
+            self.stdout.write('%s joined game %d' % (user.username, game.id))
+        for game in bots.pending_replies(user):
+            move = bots.reply(game)
+            if move is not None:
+                self.stdout.write('%s played %d -> %d in game %d' %
+                                  (user.username, move.origin, move.target,
+                                   game.id))
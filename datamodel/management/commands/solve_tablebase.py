@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from datamodel import tablebase
+
+
+class Command(BaseCommand):
+    help = 'Solves Mouse & Cats by backward induction and writes the ' +\
+           'win/loss/distance tablebase to disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.TABLEBASE_PATH,
+                            help='Destination file (TABLEBASE_PATH by '
+                                 'default)')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        step = max(1, tablebase.N_CAT_SETS // 20)
+
+        def progress(done, total):
+            if done % step == 0 or done == total:
+                self.stdout.write('%d/%d cat sets solved' % (done, total))
+
+        table = tablebase.solve(progress=progress)
+        tablebase.write(table, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            '%d positions written to %s in %.1fs' %
+            (tablebase.N_POSITIONS, options['output'], time.time() - start)))
@@ -0,0 +1,189 @@
+"""
+Monte Carlo tree search player.
+
+The search is root-parallel: each process of a multiprocessing pool grows
+its own UCT tree from the same position with random playouts, and the
+visit counts of the root moves are added up at the end. Workers only need
+datamodel.board, so no database connection crosses the process boundary.
+"""
+import atexit
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from datamodel import board
+
+# Playouts between two clock checks when searching against a time limit
+CLOCK_INTERVAL = 16
+
+
+class _Node():
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins',
+                 'cats', 'mouse', 'cat_turn', 'winner')
+
+    def __init__(self, cats, mouse, cat_turn, move=None, parent=None):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.cats = cats
+        self.mouse = mouse
+        self.cat_turn = cat_turn
+        self.winner = board.winner(cats, mouse, cat_turn)
+        if self.winner is not None:
+            self.untried = []
+        elif cat_turn:
+            self.untried = board.cat_moves(cats, mouse)
+        else:
+            self.untried = board.mouse_moves(cats, mouse)
+        self.visits = 0
+        # Wins of the side that moved into this node
+        self.wins = 0.0
+
+    def play(self, move):
+        origin, target = move
+        if self.cat_turn:
+            return (self.cats ^ (1 << origin) ^ (1 << target), self.mouse,
+                    False)
+        return self.cats, target, True
+
+    def select_child(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda c: c.wins / c.visits +
+                   exploration * math.sqrt(log_visits / c.visits))
+
+
+def playout(cats, mouse, cat_turn, rng):
+    """ Plays random moves until the game ends and returns the winner """
+    while True:
+        winner = board.winner(cats, mouse, cat_turn)
+        if winner is not None:
+            return winner
+        if cat_turn:
+            origin, target = rng.choice(board.cat_moves(cats, mouse))
+            cats ^= (1 << origin) | (1 << target)
+        else:
+            mouse = rng.choice(board.mouse_moves(cats, mouse))[1]
+        cat_turn = not cat_turn
+
+
+def _grow_tree(task):
+    """
+    Grows one UCT tree. 'task' is (cats, mouse, cat_turn, playouts,
+    deadline, seed, exploration); the search stops after 'playouts'
+    playouts or at 'deadline' (time.time() based), whichever comes first,
+    but not before the first playout.
+    Returns ({move: (visits, wins)}, playouts done).
+    """
+    cats, mouse, cat_turn, playouts, deadline, seed, exploration = task
+    rng = random.Random(seed)
+    root = _Node(cats, mouse, cat_turn)
+    done = 0
+    while playouts is None or done < playouts:
+        # At least one playout, however late the task started
+        if deadline is not None and done and not done % CLOCK_INTERVAL and\
+           time.time() >= deadline:
+            break
+        node = root
+        while not node.untried and node.children:
+            node = node.select_child(exploration)
+        if node.untried:
+            move = node.untried.pop(rng.randrange(len(node.untried)))
+            child = _Node(*node.play(move), move=move, parent=node)
+            node.children.append(child)
+            node = child
+        if node.winner is not None:
+            winner = node.winner
+        else:
+            winner = playout(node.cats, node.mouse, node.cat_turn, rng)
+        done += 1
+        while node is not None:
+            node.visits += 1
+            if node.parent is not None:
+                mover = board.CAT if node.parent.cat_turn else board.MOUSE
+                if winner == mover:
+                    node.wins += 1
+            node = node.parent
+    return {c.move: (c.visits, c.wins) for c in root.children}, done
+
+
+_pools = {}
+
+
+def _get_pool(workers):
+    if workers not in _pools:
+        _pools[workers] = multiprocessing.Pool(processes=workers)
+    return _pools[workers]
+
+
+@atexit.register
+def _close_pools():
+    for pool in _pools.values():
+        pool.terminate()
+    _pools.clear()
+
+
+class MonteCarlo():
+    """
+    MCTS player. The search stops after 'playouts' playouts in total or
+    after 'max_time' seconds, whichever comes first (at least one of them
+    must be given). 'workers' is the size of the process pool, all cores
+    by default; with a single worker the search runs in-process.
+    Statistics of the last search, including rollouts per second, are
+    kept in last_stats.
+    """
+    def __init__(self, playouts=None, max_time=None, workers=None,
+                 exploration=1.4):
+        if playouts is None and max_time is None:
+            raise ValueError('A playout count or a time limit is required')
+        self.playouts = playouts
+        self.max_time = max_time
+        self.workers = workers or os.cpu_count() or 1
+        self.exploration = exploration
+        self.last_stats = None
+
+    def best_move(self, game):
+        return self.search(game._get_cats_mask(), game.mouse, game.cat_turn)
+
+    def search(self, cats, mouse, cat_turn):
+        """
+        Most visited (origin, target) move of the position, or None if
+        there are no moves.
+        """
+        # The first search of a pool waits for its processes to start:
+        # the clock starts once they are up
+        pool = _get_pool(self.workers) if self.workers > 1 else None
+        start = time.time()
+        deadline = start + self.max_time if self.max_time else None
+        tasks = []
+        for worker in range(self.workers):
+            playouts = None
+            if self.playouts is not None:
+                # Spread the playouts evenly over the workers
+                playouts = self.playouts // self.workers +\
+                    (worker < self.playouts % self.workers)
+            tasks.append((cats, mouse, cat_turn, playouts, deadline,
+                          random.getrandbits(64), self.exploration))
+        if pool is None:
+            results = [_grow_tree(tasks[0])]
+        else:
+            results = pool.map(_grow_tree, tasks)
+
+        visits = {}
+        playouts = 0
+        for root_moves, done in results:
+            playouts += done
+            for move, (n, _) in root_moves.items():
+                visits[move] = visits.get(move, 0) + n
+        elapsed = time.time() - start
+        self.last_stats = {
+            'rollouts': playouts,
+            'elapsed': elapsed,
+            'rollouts_per_second': playouts / elapsed if elapsed else 0.0,
+            'workers': self.workers,
+        }
+        if not visits:
+            return None
+        return max(visits, key=visits.get)
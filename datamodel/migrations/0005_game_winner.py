@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0004_auto_20191116_2145'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='winner',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
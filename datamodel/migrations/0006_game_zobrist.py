@@ -0,0 +1,30 @@
+# Generated by Django 2.1.7 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+from datamodel import board
+
+
+def fill_zobrist(apps, schema_editor):
+    Game = apps.get_model('datamodel', 'Game')
+    for game in Game.objects.filter(zobrist=None).iterator():
+        cats = board.cells_mask(game.cat1, game.cat2, game.cat3, game.cat4)
+        key = board.zobrist(cats, game.mouse, game.cat_turn)
+        Game.objects.filter(id=game.id).update(
+            zobrist=board.to_signed64(key))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0005_game_winner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='zobrist',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_zobrist, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.7 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+from datamodel import movelog
+
+
+def fill_move_log(apps, schema_editor):
+    Game = apps.get_model('datamodel', 'Game')
+    Move = apps.get_model('datamodel', 'Move')
+    for game in Game.objects.filter(move__isnull=False).distinct()\
+                            .iterator():
+        log = b''
+        for move in Move.objects.filter(game=game).order_by('id'):
+            log = movelog.append(log, move.player_id == game.cat_user_id,
+                                 move.origin, move.target)
+        Game.objects.filter(id=game.id).update(move_log=log)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0006_game_zobrist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='move_log',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(fill_move_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0008_game_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counter',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0009_counter_shard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(mouse_user__isnull=True), fields=['-id'], name='game_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'cat_user'], name='game_status_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'mouse_user'], name='game_status_mouse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='move',
+            index=models.Index(fields=['game', 'id'], name='move_game_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0010_game_move_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_status_cat_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_status_mouse_idx',
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'cat_user', '-id'], name='game_status_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'mouse_user', '-id'], name='game_status_mouse_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+def fill_ply(apps, schema_editor):
+    Move = apps.get_model('datamodel', 'Move')
+    game_id = None
+    changed = []
+    for move in Move.objects.order_by('game_id', 'id').iterator():
+        if move.game_id != game_id:
+            game_id = move.game_id
+            ply = 0
+        ply += 1
+        move.ply = ply
+        changed.append(move)
+        if len(changed) >= 1000:
+            Move.objects.bulk_update(changed, ['ply'])
+            changed = []
+    Move.objects.bulk_update(changed, ['ply'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0011_game_status_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='move',
+            name='ply',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_ply, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='move',
+            name='ply',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.RemoveIndex(
+            model_name='move',
+            name='move_game_id_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='move',
+            constraint=models.UniqueConstraint(fields=('game', 'ply'), name='move_game_ply_uniq'),
+        ),
+    ]
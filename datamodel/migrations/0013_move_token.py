@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0012_move_ply'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='move',
+            name='token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='move',
+            constraint=models.UniqueConstraint(fields=('player', 'token'), name='move_player_token_uniq'),
+        ),
+    ]
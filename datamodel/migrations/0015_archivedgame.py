@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:40
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('datamodel', '0014_check_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedGame',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('winner', models.IntegerField(blank=True, null=True)),
+                ('move_log', models.BinaryField(default=b'')),
+                ('finished', models.DateField(default=datetime.date.today)),
+                ('cat_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_as_cat', to=settings.AUTH_USER_MODEL)),
+                ('mouse_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_as_mouse', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0015_archivedgame'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
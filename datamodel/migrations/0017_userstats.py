@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    # The counters of the games written before this migration; new games
+    # keep them up to date from here on
+    from datamodel import stats
+    UserStats = apps.get_model('datamodel', 'UserStats')
+    UserStats.objects.bulk_create(
+        UserStats(user_id=user, **counts)
+        for user, counts in stats.count_games().items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('datamodel', '0016_game_created'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('games_as_cat', models.IntegerField(default=0)),
+                ('games_as_mouse', models.IntegerField(default=0)),
+                ('cat_wins', models.IntegerField(default=0)),
+                ('cat_losses', models.IntegerField(default=0)),
+                ('mouse_wins', models.IntegerField(default=0)),
+                ('mouse_losses', models.IntegerField(default=0)),
+                ('active_games', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0017_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='rating',
+            field=models.FloatField(default=1200.0),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-rating', 'user'], name='userstats_rating_idx'),
+        ),
+    ]
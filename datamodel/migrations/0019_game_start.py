@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+from datamodel import board, movelog, replay
+
+
+def fill_start(apps, schema_editor):
+    # Best effort for existing games: undo their moves from the current
+    # position
+    Game = apps.get_model('datamodel', 'Game')
+    changed = []
+    for game in Game.objects.iterator():
+        position = replay.Position(
+            board.cells_mask(game.cat1, game.cat2, game.cat3, game.cat4),
+            game.mouse, game.cat_turn)
+        plies = movelog.decode(bytes(game.move_log))
+        game.start = replay.pack(replay.start_of(position, plies))
+        changed.append(game)
+        if len(changed) >= 1000:
+            Game.objects.bulk_update(changed, ['start'])
+            changed = []
+    Game.objects.bulk_update(changed, ['start'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0018_userstats_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedgame',
+            name='start',
+            field=models.BigIntegerField(default=1019),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='start',
+            field=models.BigIntegerField(default=1019, editable=False),
+        ),
+        migrations.RunPython(fill_start, migrations.RunPython.noop),
+    ]
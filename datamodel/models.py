@@ -1,16 +1,31 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
+from datamodel import board, movelog
+from datamodel import replay
+from datamodel.replay import DEFAULT_SNAPSHOT_INTERVAL, Replay
+import atexit
 import datetime
+import random
+import threading
+import time
 
 
 MSG_ERROR_INVALID_CELL = "Invalid cell for a cat or the mouse|" +\
                          "Gato o ratón en posición no válida"
 MSG_ERROR_GAMESTATUS = "Game status not valid|Estado no válido"
 MSG_ERROR_MOVE = "Move not allowed|Movimiento no permitido"
+MSG_ERROR_MOVE_CONFLICT = "Game changed by another move|" +\
+                          "La partida ha cambiado por otro movimiento"
 MSG_ERROR_NEW_COUNTER = "Insert not allowed|Inseción no permitida"
 
+COUNTER_CACHE_KEY = 'mouse_cat_counter_total'
+LEADERBOARD_CACHE_KEY = 'mouse_cat_leaderboard'
+
 
 class GameStatus():
     '''
@@ -21,6 +36,86 @@ class GameStatus():
     FINISHED = 2
 
 
+class GameWinner():
+    CAT = board.CAT
+    MOUSE = board.MOUSE
+
+
+class GameManager(models.Manager):
+    def join_pending(self, user, attempts=5):
+        """
+        Joins 'user' as the mouse to the newest game waiting for a second
+        player that 'user' did not create. Returns the game, or None if
+        there are no games available.
+        The game is claimed atomically and at most one row is read per
+        attempt: with SELECT ... FOR UPDATE SKIP LOCKED where the database
+        supports it (PostgreSQL), otherwise with an UPDATE conditioned on
+        the game still being open, retried up to 'attempts' times if
+        another player claims it first.
+        """
+        pending_games = self.filter(mouse_user=None)
+        pending_games = pending_games.exclude(cat_user=user)
+        pending_games = pending_games.order_by('-id')
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                game = pending_games.select_for_update(skip_locked=True)\
+                                    .first()
+                if game is None:
+                    return None
+                game.mouse_user = user
+                game.save()
+                return game
+
+        for _ in range(attempts):
+            game = pending_games.first()
+            if game is None:
+                return None
+            with transaction.atomic():
+                claimed = self.filter(id=game.id, mouse_user=None).update(
+                    mouse_user=user, status=GameStatus.ACTIVE,
+                    version=models.F('version') + 1)
+                if claimed:
+                    game.mouse_user = user
+                    game.status = GameStatus.ACTIVE
+                    game.version += 1
+                    # Only open games match: CREATED and no winner
+                    game._record_stats((game.cat_user_id, None,
+                                        GameStatus.CREATED, None))
+                    return game
+        return None
+
+    def is_playing(self, user, game_id):
+        """ True if 'game_id' is an ACTIVE game where 'user' plays """
+        return self.filter(models.Q(cat_user=user) |
+                           models.Q(mouse_user=user),
+                           id=game_id, status=GameStatus.ACTIVE).exists()
+
+    def active_page(self, user, as_cat, before=None, size=20):
+        """
+        Page of at most 'size' ACTIVE games of 'user' as cat (as mouse if
+        'as_cat' is False), newest first, with id lower than 'before' if
+        given. Returns (games, next), where 'next' is the 'before' of the
+        following page or None on the last one.
+        Keyset pagination over the (status, user, -id) indexes: every page
+        costs the same however many games the user has, and only the
+        columns in Game.LIST_FIELDS are read.
+        """
+        role = 'cat_user' if as_cat else 'mouse_user'
+        games = self.filter(**{role: user, 'status': GameStatus.ACTIVE})
+        if before is not None:
+            games = games.filter(id__lt=before)
+        games = games.select_related('cat_user', 'mouse_user')\
+                     .only(*Game.LIST_FIELDS).order_by('-id')
+        games = list(games[:size + 1])
+        if len(games) > size:
+            return games[:size], games[size - 1].id
+        return games, None
+
+    def same_position(self, game):
+        """ Games whose current position is the one of 'game' """
+        return self.filter(zobrist=game.zobrist).exclude(id=game.id)
+
+
 class Game(models.Model):
     '''
     (main author: Rafael Sanchez)
@@ -64,11 +159,95 @@ class Game(models.Model):
     cat_turn = models.BooleanField(default=True)
     # Game status
     status = models.IntegerField(default=GameStatus.CREATED)
+    # Winner side once the game is over through play (GameWinner)
+    winner = models.IntegerField(blank=True, null=True, db_index=True)
+    # Zobrist hash of the position, see board.zobrist (signed 64 bits)
+    zobrist = models.BigIntegerField(blank=True, null=True, db_index=True,
+                                     editable=False)
+    # One byte per ply, see datamodel.movelog
+    move_log = models.BinaryField(default=b'', editable=False)
+    # Position the move log starts from (see replay.pack); follows the
+    # position fields until the first move
+    start = models.BigIntegerField(default=replay.START_KEY, editable=False)
+    # Bumped on every write, for optimistic concurrency control
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Creation time, to find games nobody joined or played (see cleanup)
+    created = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = GameManager()
+
+    class Meta:
+        indexes = [
+            # Lobby of join_pending: open games, newest first
+            models.Index(fields=['-id'], name='game_open_idx',
+                         condition=models.Q(mouse_user__isnull=True)),
+            # Games of a user by status, as cat and as mouse
+            models.Index(fields=['status', 'cat_user', '-id'],
+                         name='game_status_cat_idx'),
+            models.Index(fields=['status', 'mouse_user', '-id'],
+                         name='game_status_mouse_idx'),
+        ]
+        # The rules of clean() and save() in the database, so bulk_create,
+        # bulk_update and QuerySet.update cannot break them: pieces on dark
+        # cells (which are also within the board) and a mouse player from
+        # the moment the game is active
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(**{f + '__in': board.DARK_CELLS
+                                  for f in ('cat1', 'cat2', 'cat3', 'cat4',
+                                            'mouse')}),
+                name='game_cells_dark'),
+            models.CheckConstraint(
+                check=models.Q(status=GameStatus.CREATED,
+                               mouse_user__isnull=True) |
+                models.Q(status__in=(GameStatus.ACTIVE, GameStatus.FINISHED),
+                         mouse_user__isnull=False),
+                name='game_status_players'),
+            models.CheckConstraint(
+                check=models.Q(winner__isnull=True) |
+                models.Q(winner__in=(GameWinner.CAT, GameWinner.MOUSE),
+                         status=GameStatus.FINISHED),
+                name='game_winner'),
+        ]
+
+    POSITION_FIELDS = ('cat1', 'cat2', 'cat3', 'cat4', 'mouse', 'cat_turn')
+    # Fields a move may change, written by _save_move()
+    MOVE_FIELDS = POSITION_FIELDS + ('status', 'winner', 'zobrist',
+                                     'move_log')
+    HASHED_FIELDS = POSITION_FIELDS + ('zobrist',)
+    # Columns UserStats depends on
+    STATS_FIELDS = ('cat_user_id', 'mouse_user_id', 'status', 'winner')
+    # Columns str(game) needs, for the game lists
+    LIST_FIELDS = ('id', 'status') + POSITION_FIELDS +\
+        ('cat_user__username', 'mouse_user__username')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        game = super(Game, cls).from_db(db, field_names, values)
+        # The stored hash is trusted for the position it was loaded with
+        if all(f in field_names for f in Game.HASHED_FIELDS) and\
+           game.zobrist is not None:
+            game._hashed_position = game._get_position()
+        return game
 
     # Game moves
     @property
     def moves(self):
-        return Move.objects.filter(game=self)
+        return Move.objects.filter(game=self).order_by('ply')
+
+    def history(self):
+        """
+        Every ply played so far as movelog.Ply tuples (cat, origin,
+        target), decoded from move_log without querying Move.
+        """
+        return movelog.decode(self.move_log)
+
+    def replay(self, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        """
+        Replay of this game from its start position, to seek to or
+        stream the position at any ply.
+        """
+        return Replay.for_game(self, snapshot_interval)
 
     def __str_game_status(self):
         if self.status == 0:
@@ -79,11 +258,7 @@ class Game(models.Model):
             return "Finished"
 
     def __pos_is_valid(self, position):
-        if not position:
-            return True
-        odd_col = bool((position//Game.WIDTH) % 2)
-        odd_row = bool((position % Game.WIDTH) % 2)
-        return not (odd_col ^ odd_row)
+        return board.is_dark(position)
 
     def clean(self, exclude=None):
         # Validators for cat not null and cell's range are already
@@ -109,11 +284,148 @@ class Game(models.Model):
             raise ValidationError(MSG_ERROR_INVALID_CELL)
         if not self.__pos_is_valid(self.mouse):
             raise ValidationError(MSG_ERROR_INVALID_CELL)
-        super(Game, self).save(*args, **kwargs)
+        if self.zobrist is None or self.__zobrist_is_stale():
+            self._compute_zobrist()
+        if not self.move_log:
+            self.start = replay.pack(replay.Position(
+                self._get_cats_mask(), self.mouse, self.cat_turn))
+        if self.pk is not None:
+            self.version += 1
+        with transaction.atomic():
+            old_stats = self._stored_stats_state()
+            super(Game, self).save(*args, **kwargs)
+            self._record_stats(old_stats)
+
+    def _get_position(self):
+        return (self.cat1, self.cat2, self.cat3, self.cat4, self.mouse,
+                self.cat_turn)
+
+    def __zobrist_is_stale(self):
+        return getattr(self, '_hashed_position', None) !=\
+            self._get_position()
+
+    def _save_move(self, version, old_stats):
+        """
+        Writes the fields changed by a move in a single UPDATE that only
+        applies if the row is still at 'version', where its stats state
+        (see STATS_FIELDS) was 'old_stats'. Returns False if another
+        write got there first.
+        """
+        fields = {f: getattr(self, f) for f in Game.MOVE_FIELDS}
+        updated = Game.objects.filter(id=self.id, version=version)\
+                              .update(version=version + 1, **fields)
+        if not updated:
+            return False
+        self.version = version + 1
+        self._record_stats(old_stats)
+        return True
+
+    def _get_stats_state(self):
+        return tuple(getattr(self, f) for f in Game.STATS_FIELDS)
+
+    def _stored_stats_state(self):
+        """
+        Stats state of the row this game is about to overwrite, None if
+        there is none; the row stays locked until the end of the
+        transaction, so the state cannot change before the write
+        """
+        if self.pk is None:
+            return None
+        return Game.objects.select_for_update().filter(id=self.pk)\
+                           .values_list(*Game.STATS_FIELDS).first()
+
+    def _record_stats(self, old=None):
+        """
+        Updates UserStats from state 'old' to the current players, status
+        and winner. Must run in the transaction that writes them.
+        """
+        UserStats.objects.record(old, self._get_stats_state())
+
+    def _compute_zobrist(self):
+        self.zobrist = board.to_signed64(board.zobrist(
+            self._get_cats_mask(), self.mouse, self.cat_turn))
+        self._hashed_position = self._get_position()
+
+    def _play(self, origin, target):
+        """
+        Applies an already validated move to the position, flips the turn,
+        appends it to the move log and updates the Zobrist hash
+        incrementally.
+        """
+        if self.zobrist is None or self.__zobrist_is_stale():
+            self._compute_zobrist()
+        self.move_log = movelog.append(self.move_log, self.cat_turn, origin,
+                                       target)
+        key = (self.zobrist & board.FULL) ^ board.ZOBRIST_CAT_TURN
+        if self.cat_turn:
+            key ^= board.ZOBRIST_CAT[origin] ^ board.ZOBRIST_CAT[target]
+            if origin == self.cat1:
+                self.cat1 = target
+            elif origin == self.cat2:
+                self.cat2 = target
+            elif origin == self.cat3:
+                self.cat3 = target
+            else:
+                self.cat4 = target
+        else:
+            key ^= board.ZOBRIST_MOUSE[origin] ^ board.ZOBRIST_MOUSE[target]
+            self.mouse = target
+        self.cat_turn = not self.cat_turn
+        self.zobrist = board.to_signed64(key)
+        self._hashed_position = self._get_position()
 
     def _get_cat_places(self):
         return [self.cat1, self.cat2, self.cat3, self.cat4]
 
+    def _get_cats_mask(self):
+        return board.cells_mask(self.cat1, self.cat2, self.cat3, self.cat4)
+
+    def _get_board(self):
+        return board.to_list(self._get_cats_mask(), self.mouse)
+
+    def _check_finished(self):
+        """
+        Finishes the game if the side to move has lost or the mouse got
+        past all cats. Returns True if the game is over.
+        """
+        winner = board.winner(self._get_cats_mask(), self.mouse,
+                              self.cat_turn)
+        if winner is None:
+            return False
+        self.winner = winner
+        self.status = GameStatus.FINISHED
+        return True
+
+    def canonical_key(self):
+        """
+        Position key shared by every game with the same cat set, mouse
+        cell and side to move (see board.canonical_key).
+        """
+        return board.canonical_key(self._get_cats_mask(), self.mouse,
+                                   self.cat_turn)
+
+    def legal_moves(self):
+        """
+        List of (origin, target) pairs the side to move may play in the
+        current position. Players and game status are not taken into
+        account, only the board.
+        """
+        if self.cat_turn:
+            return board.cat_moves(self._get_cats_mask(), self.mouse)
+        return board.mouse_moves(self._get_cats_mask(), self.mouse)
+
+    def is_legal(self, origin, target):
+        """
+        True if moving 'origin' to 'target' is legal for the side to move
+        in the current position. Like legal_moves(), it only looks at the
+        board and never queries the database.
+        """
+        if self.cat_turn:
+            return board.valid_cat_move(self._get_cats_mask(), self.mouse,
+                                        origin, target)
+        return board.valid_mouse_move(self._get_cats_mask(), self.mouse,
+                                      origin, target)
+
     def __str__(self):
         id = str(self.id)
         status = self.__str_game_status()
@@ -138,6 +450,40 @@ class Game(models.Model):
         return ret_str
 
 
+class MoveManager(models.Manager):
+    def replayed(self, player, token):
+        """
+        Move already saved by 'player' with idempotency key 'token', or
+        None if 'token' is empty or was never used.
+        """
+        if not token:
+            return None
+        return self.filter(player=player, token=token)\
+                   .only('id', 'game', 'ply').first()
+
+    def history(self, game, before=None, after=None, size=20):
+        """
+        Page of at most 'size' moves of 'game' (a Game or its id) in play
+        order. With 'after', the moves that follow ply 'after'; otherwise
+        the moves before ply 'before', or the latest ones if it is None.
+        The first and last ply of a page are the cursors of the pages
+        around it. Archived games are read from their ArchivedGame row.
+        """
+        moves = self.filter(game=game)
+        if after is not None:
+            page = list(moves.filter(ply__gt=after).order_by('ply')[:size])
+        else:
+            if before is not None:
+                moves = moves.filter(ply__lt=before)
+            page = list(moves.order_by('-ply')[:size])[::-1]
+        if not page:
+            archived = ArchivedGame.objects.filter(id=getattr(game, 'id',
+                                                              game)).first()
+            if archived is not None:
+                return archived.moves(before, after, size)
+        return page
+
+
 class Move(models.Model):
     '''
     (main author: Alejandro Santorum)
@@ -153,112 +499,389 @@ class Move(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     player = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField(default=datetime.date.today)
+    # Number of the move in its game, from 1; the unique (game, ply) index
+    # also serves the history pages
+    ply = models.PositiveIntegerField(editable=False)
+    # Idempotency key sent by the client, unique per player
+    token = models.CharField(max_length=64, blank=True, null=True,
+                             editable=False)
+    objects = MoveManager()
 
-    def __pos_to_list(self, position):
-        return [(position//Game.WIDTH) + 1, (position % Game.WIDTH) + 1]
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'ply'],
+                                    name='move_game_ply_uniq'),
+            models.UniqueConstraint(fields=['player', 'token'],
+                                    name='move_player_token_uniq'),
+            models.CheckConstraint(
+                check=models.Q(origin__in=board.DARK_CELLS,
+                               target__in=board.DARK_CELLS, ply__gte=1),
+                name='move_cells_dark'),
+        ]
 
     def __cat_valid_move(self):
         if not self.game.cat_turn:
             return False
-        cats = self.game._get_cat_places()
-        if self.origin not in cats or self.target in cats:
-            return False
-        if self.target == self.game.mouse:
-            return False
-        origin_lst = self.__pos_to_list(self.origin)
-        target_lst = self.__pos_to_list(self.target)
-        SE_lst = [x+1 for x in origin_lst]
-        SW_lst = [origin_lst[0]+1, origin_lst[1]-1]
-        if SE_lst == target_lst:
-            return True
-        if SW_lst == target_lst:
-            return True
-        return False
+        return self.game.is_legal(self.origin, self.target)
 
     def __mouse_valid_move(self):
         if self.game.cat_turn:
             return False
-        cats = self.game._get_cat_places()
-        if self.target in cats:
-            return False
-        if self.origin != self.game.mouse:
-            return False
-        origin_lst = self.__pos_to_list(self.origin)
-        target_lst = self.__pos_to_list(self.target)
-        SE_lst = [x+1 for x in origin_lst]
-        SW_lst = [origin_lst[0]+1, origin_lst[1]-1]
-        NW_lst = [x-1 for x in origin_lst]
-        NE_lst = [origin_lst[0]-1, origin_lst[1]+1]
-        if SE_lst == target_lst:
-            return True
-        if SW_lst == target_lst:
-            return True
-        if NW_lst == target_lst:
-            return True
-        if NE_lst == target_lst:
-            return True
-        return False
+        return self.game.is_legal(self.origin, self.target)
 
     def save(self, *args, **kwargs):
+        # Players are compared by id so that no User row is fetched
+        game = self.game
         if self.target < 0 or self.target > 63:
             raise ValidationError(MSG_ERROR_MOVE)
-        if self.player != self.game.mouse_user and\
-           self.player != self.game.cat_user:
+        if self.player_id != game.mouse_user_id and\
+           self.player_id != game.cat_user_id:
             raise ValidationError(MSG_ERROR_MOVE)
-        if self.game.status != GameStatus.ACTIVE:
+        if game.status != GameStatus.ACTIVE:
             raise ValidationError(MSG_ERROR_MOVE)
-        if self.player == self.game.cat_user and not self.__cat_valid_move():
+        if self.player_id == game.cat_user_id and\
+           not self.__cat_valid_move():
             raise ValidationError(MSG_ERROR_MOVE)
-        if self.player == self.game.mouse_user and not\
-           self.__mouse_valid_move():
+        if self.player_id == game.mouse_user_id and\
+           not self.__mouse_valid_move():
             raise ValidationError(MSG_ERROR_MOVE)
 
-        super(Move, self).save(*args, **kwargs)
-        if self.player == self.game.mouse_user:
-            self.game.mouse = self.target
-            self.game.cat_turn = True
-        else:
-            if self.origin == self.game.cat1:
-                self.game.cat1 = self.target
-            elif self.origin == self.game.cat2:
-                self.game.cat2 = self.target
-            elif self.origin == self.game.cat3:
-                self.game.cat3 = self.target
-            else:
-                self.game.cat4 = self.target
-            self.game.cat_turn = False
-        self.game.save()
+        # Move insert plus one conditional UPDATE of the game: if the game
+        # row moved on since it was read, nothing is written
+        version = game.version
+        state = {f: getattr(game, f) for f in Game.MOVE_FIELDS}
+        hashed_position = getattr(game, '_hashed_position', None)
+        old_stats = game._get_stats_state()
+        self.ply = len(game.move_log) + 1
+        try:
+            with transaction.atomic():
+                try:
+                    super(Move, self).save(*args, **kwargs)
+                except IntegrityError:
+                    # Another move took this ply of the game first
+                    raise ValidationError(MSG_ERROR_MOVE_CONFLICT,
+                                          code='conflict')
+                game._play(self.origin, self.target)
+                game._check_finished()
+                if not game._save_move(version, old_stats):
+                    raise ValidationError(MSG_ERROR_MOVE_CONFLICT,
+                                          code='conflict')
+        except Exception:
+            for field, value in state.items():
+                setattr(game, field, value)
+            game._hashed_position = hashed_position
+            self.pk = None
+            raise
 
     def __str__(self):
         return '['+str(self.player)+'] - Origen: '+str(self.origin)\
                 + ' - Destino: '+str(self.target)
 
 
+class ArchivedGame(models.Model):
+    # Finished game moved out of Game and Move by datamodel.archive, with
+    # the id it had as a Game
+    id = models.IntegerField(primary_key=True)
+    cat_user = models.ForeignKey(User, on_delete=models.CASCADE,
+                                 related_name="archived_as_cat")
+    mouse_user = models.ForeignKey(User, on_delete=models.CASCADE,
+                                   related_name="archived_as_mouse")
+    winner = models.IntegerField(blank=True, null=True)
+    # Every ply of the game, as Game.move_log (see datamodel.movelog)
+    move_log = models.BinaryField(default=b'')
+    # Position the move log starts from, as Game.start
+    start = models.BigIntegerField(default=replay.START_KEY)
+    # Date of the last move, or of archival for games without moves
+    finished = models.DateField(default=datetime.date.today)
+
+    def history(self):
+        """ Every ply of the game as movelog.Ply tuples """
+        return movelog.decode(self.move_log)
+
+    def replay(self, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        return Replay.for_game(self, snapshot_interval)
+
+    def moves(self, before=None, after=None, size=20):
+        """
+        Page of unsaved Move objects decoded from move_log, with the same
+        cursors as MoveManager.history()
+        """
+        moves = [Move(game_id=self.id, ply=number, origin=ply.origin,
+                      target=ply.target,
+                      player_id=self.cat_user_id if ply.cat
+                      else self.mouse_user_id)
+                 for number, ply in enumerate(self.history(), 1)]
+        if after is not None:
+            return moves[after:after + size]
+        if before is not None:
+            moves = moves[:max(before - 1, 0)]
+        return moves[-size:] if size else []
+
+
+def role_stats(as_cat, status, winner):
+    """ UserStats fields a game adds to one of its players """
+    if as_cat:
+        stats = {'games_as_cat': 1}
+        if winner is not None:
+            stats['cat_wins' if winner == GameWinner.CAT
+                  else 'cat_losses'] = 1
+    else:
+        stats = {'games_as_mouse': 1}
+        if winner is not None:
+            stats['mouse_wins' if winner == GameWinner.MOUSE
+                  else 'mouse_losses'] = 1
+    if status == GameStatus.ACTIVE:
+        stats['active_games'] = 1
+    return stats
+
+
+def game_stats(state):
+    """
+    {user id: {field: amount}} that a game with 'state' (see
+    Game.STATS_FIELDS) adds to UserStats; empty for None
+    """
+    stats = {}
+    if state is None:
+        return stats
+    cat_user, mouse_user, status, winner = state
+    for user, as_cat in ((cat_user, True), (mouse_user, False)):
+        if user is None:
+            continue
+        user_stats = stats.setdefault(user, {})
+        for field, amount in role_stats(as_cat, status, winner).items():
+            user_stats[field] = user_stats.get(field, 0) + amount
+    return stats
+
+
+def _decided(state):
+    """ Whether a game with 'state' is finished with a winner and loser """
+    return state is not None and state[1] is not None and\
+        state[2] == GameStatus.FINISHED and state[3] is not None
+
+
+class UserStatsManager(models.Manager):
+    def record(self, old, new):
+        """
+        Applies the change of a game from state 'old' to state 'new'
+        (tuples of Game.STATS_FIELDS, None for no game)
+        """
+        self.record_all([(old, new)])
+        # Ratings only change once, when the game is decided
+        if _decided(new) and not _decided(old):
+            cat_user, mouse_user, _, winner = new
+            if winner == GameWinner.CAT:
+                self.rate(cat_user, mouse_user)
+            else:
+                self.rate(mouse_user, cat_user)
+
+    def rate(self, winner_id, loser_id):
+        """
+        Elo update of the ratings of the players of a decided game, whose
+        rows record() has just written. Both rows are locked, in user
+        order, until the end of the transaction.
+        """
+        players = {s.user_id: s for s in
+                   self.select_for_update().filter(
+                       user_id__in=(winner_id, loser_id)).order_by('user')}
+        winner, loser = players[winner_id], players[loser_id]
+        expected = 1 / (1 + 10 ** ((loser.rating - winner.rating) / 400))
+        change = settings.ELO_K_FACTOR * (1 - expected)
+        self.filter(user_id=winner_id).update(rating=winner.rating + change)
+        self.filter(user_id=loser_id).update(rating=loser.rating - change)
+
+    def rank(self, user):
+        """
+        Position of 'user' by rating, from 1: one more than the players
+        rated above, counted over the rating index
+        """
+        rating = self.filter(user=user).values_list('rating', flat=True)\
+                     .first()
+        if rating is None:
+            rating = settings.ELO_INITIAL_RATING
+        return self.filter(rating__gt=rating).count() + 1
+
+    def leaderboard(self):
+        """
+        The settings.LEADERBOARD_SIZE best rated players, as dicts with
+        'username', 'rating', 'wins' and 'losses'. It is cached for up to
+        settings.LEADERBOARD_CACHE_TIMEOUT seconds.
+        """
+        top = cache.get(LEADERBOARD_CACHE_KEY)
+        if top is None:
+            rows = self.select_related('user').order_by('-rating', 'user')\
+                       .only('user__username', 'rating', 'cat_wins',
+                             'mouse_wins', 'cat_losses', 'mouse_losses')
+            top = [{'username': s.user.username, 'rating': round(s.rating),
+                    'wins': s.wins, 'losses': s.losses}
+                   for s in rows[:settings.LEADERBOARD_SIZE]]
+            cache.set(LEADERBOARD_CACHE_KEY, top,
+                      settings.LEADERBOARD_CACHE_TIMEOUT)
+        return top
+
+    def record_all(self, changes):
+        """
+        Applies the counters of many (old, new) game changes, as record()
+        but without updating ratings: for imports and deletions. Rows are
+        written in user order, the same order rate() locks them in.
+        """
+        amounts = {}
+        for old, new in changes:
+            for state, sign in ((new, 1), (old, -1)):
+                for user, stats in game_stats(state).items():
+                    user_amounts = amounts.setdefault(user, {})
+                    for field, amount in stats.items():
+                        user_amounts[field] = user_amounts.get(field, 0) +\
+                            sign * amount
+        for user in sorted(amounts):
+            self.add(user, **{f: n for f, n in amounts[user].items() if n})
+
+    def add(self, user_id, **amounts):
+        """ Adds 'amounts' to the fields of the stats of 'user_id' """
+        if not amounts:
+            return
+        update = {f: models.F(f) + n for f, n in amounts.items()}
+        if self.filter(user_id=user_id).update(**update):
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, **amounts)
+        except IntegrityError:
+            # Created by another transaction in the meantime
+            self.filter(user_id=user_id).update(**update)
+
+
+class UserStats(models.Model):
+    # Kept up to date by Game writes, see Game._record_stats(); rebuilt
+    # from Game and ArchivedGame by the rebuild_stats command
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    games_as_cat = models.IntegerField(default=0)
+    games_as_mouse = models.IntegerField(default=0)
+    cat_wins = models.IntegerField(default=0)
+    cat_losses = models.IntegerField(default=0)
+    mouse_wins = models.IntegerField(default=0)
+    mouse_losses = models.IntegerField(default=0)
+    active_games = models.IntegerField(default=0)
+    # Elo rating, updated when a game finishes, see UserStatsManager.rate()
+    rating = models.FloatField(default=settings.ELO_INITIAL_RATING)
+    objects = UserStatsManager()
+
+    class Meta:
+        indexes = [
+            # Leaderboard and rank() without sorting all the players
+            models.Index(fields=['-rating', 'user'],
+                         name='userstats_rating_idx'),
+        ]
+
+    FIELDS = ('games_as_cat', 'games_as_mouse', 'cat_wins', 'cat_losses',
+              'mouse_wins', 'mouse_losses', 'active_games')
+
+    @property
+    def games(self):
+        return self.games_as_cat + self.games_as_mouse
+
+    @property
+    def wins(self):
+        return self.cat_wins + self.mouse_wins
+
+    @property
+    def losses(self):
+        return self.cat_losses + self.mouse_losses
+
+    def __str__(self):
+        return '%s: %d games, %d wins, %d losses' %\
+            (self.user_id, self.games, self.wins, self.losses)
+
+
+class CounterQuerySet(models.QuerySet):
+    def delete(self):
+        deleted = super().delete()
+        cache.delete(COUNTER_CACHE_KEY)
+        return deleted
+
+
 class CounterManager(models.Manager):
     '''
     (author: Rafael Sanchez)
+    ----------
+    The global counter is split in settings.COUNTER_SHARDS rows. Each
+    increment adds to a random shard with an F() expression, so concurrent
+    requests neither lose increments nor queue on a single row. inc()
+    returns the new total, so no separate read is needed.
+    The total is kept in the cache for settings.COUNTER_CACHE_TIMEOUT
+    seconds: writes add to the cached value and reads return it, so the
+    shards are only summed when it is missing. With a per-process cache,
+    the increments of other processes show up when it expires.
+    With settings.COUNTER_FLUSH_INTERVAL > 0 increments are also buffered
+    in-process and written with a single UPDATE at most once per interval;
+    in between, inc() answers from the cached total.
     '''
-    def init_counter(self):
-        counter = Counter()
+    _lock = threading.Lock()
+    _pending = 0
+    _last_flush = 0.0
+
+    def get_queryset(self):
+        return CounterQuerySet(self.model, using=self._db)
+
+    def init_counter(self, shard=0):
+        counter = Counter(shard=shard)
         super(Counter, counter).save()
         return counter
 
     def inc(self):
-        objs = self.get_queryset()
-        if len(objs) == 0:
-            counter = self.init_counter()
-        else:
-            counter = objs[0]
-        val = self.get_current_value()
-        counter.value = val+1
-        super(Counter, counter).save()
-        return val+1
+        interval = settings.COUNTER_FLUSH_INTERVAL
+        if interval <= 0:
+            return self._add(1)
+        with CounterManager._lock:
+            CounterManager._pending += 1
+            pending = CounterManager._pending
+            if time.time() - CounterManager._last_flush < interval:
+                return self._get_total() + pending
+            CounterManager._pending = 0
+            CounterManager._last_flush = time.time()
+        return self._add(pending)
+
+    def flush(self):
+        """ Writes the increments buffered in this process, if any """
+        with CounterManager._lock:
+            pending = CounterManager._pending
+            CounterManager._pending = 0
+            CounterManager._last_flush = time.time()
+        if pending:
+            self._add(pending)
 
     def get_current_value(self):
-        objs = super().get_queryset()
-        if len(objs) == 0:
-            return 0
-        return objs[0].value
+        return self._get_total() + CounterManager._pending
+
+    def _add(self, amount):
+        shard = random.randrange(settings.COUNTER_SHARDS)
+        shard_qs = self.filter(shard=shard)
+        if not shard_qs.update(value=models.F('value') + amount):
+            try:
+                with transaction.atomic():
+                    self.init_counter(shard)
+            except IntegrityError:
+                # Created meanwhile by another request
+                pass
+            shard_qs.update(value=models.F('value') + amount)
+        try:
+            return cache.incr(COUNTER_CACHE_KEY, amount)
+        except ValueError:
+            # Not cached: the sum already includes this increment
+            return self._get_total()
+
+    def _sum(self):
+        return self.aggregate(total=models.Sum('value'))['total'] or 0
+
+    def _get_total(self):
+        total = cache.get(COUNTER_CACHE_KEY)
+        if total is None:
+            total = self._sum()
+            # add() keeps a total another request has just cached
+            if not cache.add(COUNTER_CACHE_KEY, total,
+                             settings.COUNTER_CACHE_TIMEOUT):
+                total = cache.get(COUNTER_CACHE_KEY, total)
+        return total
 
 
 class Counter(models.Model):
@@ -266,7 +889,18 @@ class Counter(models.Model):
     (author: Rafael Sanchez)
     '''
     value = models.IntegerField(default=0)
+    # Shard number, see CounterManager
+    shard = models.PositiveSmallIntegerField(default=0, unique=True)
     objects = CounterManager()
 
     def save(self, *args, **kwargs):
         raise ValidationError(MSG_ERROR_NEW_COUNTER)
+
+
+@atexit.register
+def _flush_counter():
+    try:
+        Counter.objects.flush()
+    except Exception:
+        # The database may already be gone at interpreter exit
+        pass
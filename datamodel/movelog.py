@@ -0,0 +1,45 @@
+"""
+Compact move log stored on Game.move_log.
+
+Every ply takes a single byte:
+
+    bit 7      1 for a cat move, 0 for a mouse move
+    bits 2..6  origin cell, as its index among the 32 dark cells
+    bits 0..1  diagonal direction, see DIRECTIONS
+
+so a whole game can be read back from one row without touching Move.
+"""
+from collections import namedtuple
+
+from datamodel import board
+
+CAT_FLAG = 0x80
+# Cell offset of each direction: NW, NE, SW, SE
+DIRECTIONS = (-board.WIDTH - 1, -board.WIDTH + 1,
+              board.WIDTH - 1, board.WIDTH + 1)
+
+Ply = namedtuple('Ply', ['cat', 'origin', 'target'])
+
+
+def encode(cat, origin, target):
+    """ Byte of a diagonal step from 'origin' to 'target' """
+    dark = board.DARK_INDEX[origin]
+    if dark < 0 or target - origin not in DIRECTIONS:
+        raise ValueError('Not a diagonal move: %d -> %d' % (origin, target))
+    return (CAT_FLAG if cat else 0) | (dark << 2) |\
+        DIRECTIONS.index(target - origin)
+
+
+def decode_ply(code):
+    origin = board.DARK_CELLS[(code >> 2) & 0x1F]
+    return Ply(bool(code & CAT_FLAG), origin, origin + DIRECTIONS[code & 3])
+
+
+def append(log, cat, origin, target):
+    """ Copy of 'log' (bytes, memoryview or None) with one more ply """
+    return bytes(log or b'') + bytes((encode(cat, origin, target),))
+
+
+def decode(log):
+    """ List of Ply tuples stored in 'log' """
+    return [decode_ply(code) for code in bytes(log or b'')]
@@ -0,0 +1,116 @@
+"""
+Replay of a game from its move history.
+
+Positions are (cats mask, mouse cell, cat_turn) triples as in
+datamodel.board. A Replay keeps a snapshot of the position every
+'snapshot_interval' plies, so seeking to any ply applies at most that many
+moves.
+"""
+from collections import namedtuple
+
+from datamodel import board
+
+Position = namedtuple('Position', ['cats', 'mouse', 'cat_turn'])
+
+# Initial position of a Game with its default fields
+START = Position(board.cells_mask(0, 2, 4, 6), 59, True)
+
+DEFAULT_SNAPSHOT_INTERVAL = 8
+
+
+def pack(position):
+    """
+    Integer form of 'position' for Game.start: the dark cells holding
+    cats as a 32-bit mask, then the dark index of the mouse (5 bits) and
+    the side to move (1 bit)
+    """
+    dark = 0
+    for cell in board.mask_cells(position.cats):
+        dark |= 1 << board.DARK_INDEX[cell]
+    return (dark << 6) | (board.DARK_INDEX[position.mouse] << 1) |\
+        bool(position.cat_turn)
+
+
+def unpack(key):
+    """ Position packed by pack() """
+    cats = 0
+    dark = key >> 6
+    for index, cell in enumerate(board.DARK_CELLS):
+        if dark >> index & 1:
+            cats |= 1 << cell
+    return Position(cats, board.DARK_CELLS[key >> 1 & 0x1F], bool(key & 1))
+
+
+START_KEY = pack(START)
+
+
+def undo_ply(position, ply):
+    """ Position before movelog.Ply 'ply' was played to reach 'position' """
+    if ply.cat:
+        cats = position.cats ^ (1 << ply.origin) ^ (1 << ply.target)
+        return Position(cats, position.mouse, True)
+    return Position(position.cats, ply.origin, False)
+
+
+def start_of(position, plies):
+    """
+    Position the sequence 'plies' was played from to end in 'position',
+    for games whose start position was not recorded
+    """
+    for ply in reversed(plies):
+        position = undo_ply(position, ply)
+    return position
+
+
+def apply_ply(position, ply):
+    """ Position after playing movelog.Ply 'ply' on 'position' """
+    if ply.cat:
+        cats = position.cats ^ (1 << ply.origin) ^ (1 << ply.target)
+        return Position(cats, position.mouse, False)
+    return Position(position.cats, ply.target, True)
+
+
+class Replay():
+    """
+    Seekable replay of a sequence of movelog.Ply tuples played from
+    'start'. Ply numbers go from 0 (start position) to len(replay).
+    """
+    def __init__(self, plies, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL,
+                 start=START):
+        if snapshot_interval < 1:
+            raise ValueError('snapshot_interval must be positive')
+        self.plies = list(plies)
+        self.snapshot_interval = snapshot_interval
+        self._snapshots = [start]
+        position = start
+        for number, ply in enumerate(self.plies, 1):
+            position = apply_ply(position, ply)
+            if not number % snapshot_interval:
+                self._snapshots.append(position)
+
+    @classmethod
+    def for_game(cls, game, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        """ Replay of a Game or ArchivedGame from its own start position """
+        return cls(game.history(), snapshot_interval=snapshot_interval,
+                   start=unpack(game.start))
+
+    def __len__(self):
+        return len(self.plies)
+
+    def position(self, ply):
+        """ Position after the first 'ply' plies """
+        if not 0 <= ply <= len(self.plies):
+            raise IndexError('Ply out of range: %d' % ply)
+        snapshot = ply // self.snapshot_interval
+        position = self._snapshots[snapshot]
+        for number in range(snapshot * self.snapshot_interval, ply):
+            position = apply_ply(position, self.plies[number])
+        return position
+
+    def positions(self, first=0):
+        """ Generator of every position from ply 'first' to the end """
+        position = self.position(first)
+        yield position
+        for ply in self.plies[first:]:
+            position = apply_ply(position, ply)
+            yield position
@@ -0,0 +1,227 @@
+"""
+Alpha-beta searcher for computer players.
+
+Positions are handled as (cats mask, mouse cell, cat_turn) triples from
+datamodel.board, so searching never touches the database.
+"""
+import time
+
+from datamodel import board
+
+WIN = 100000
+INF = WIN + 1
+# Scores above this are forced wins/losses found by the search
+WIN_THRESHOLD = WIN - 1000
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Nodes searched between two clock checks
+CLOCK_INTERVAL = 256
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable():
+    """
+    Fixed-size table of search results keyed by Zobrist hash. Each key
+    maps to a single slot; an occupied slot is only replaced by a result
+    at least as deep, unless it was stored by an older search.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.generation = 0
+        self._keys = [None] * size
+        self._entries = [None] * size
+
+    def new_search(self):
+        self.generation += 1
+
+    def get(self, key):
+        slot = key % self.size
+        if self._keys[slot] == key:
+            return self._entries[slot]
+        return None
+
+    def put(self, key, depth, score, flag, move):
+        slot = key % self.size
+        entry = self._entries[slot]
+        if entry is None or self._keys[slot] == key or\
+           entry[4] != self.generation or depth >= entry[0]:
+            self._keys[slot] = key
+            self._entries[slot] = (depth, score, flag, move, self.generation)
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+def evaluate(cats, mouse, cat_turn):
+    """
+    Static score of a non terminal position for the side to move. Cats
+    like a closed, level line far above the mouse and a mouse with few
+    free cells around it.
+    """
+    mouse_row = mouse // board.WIDTH
+    rows = [cell // board.WIDTH for cell in board.mask_cells(cats)]
+    score = 10 * (mouse_row - min(rows))
+    score -= 4 * (max(rows) - min(rows))
+    score -= 8 * _popcount(board.MOUSE_STEP_MASKS[mouse] & ~cats)
+    # Cats on or below the mouse row can no longer stop it
+    score -= 30 * sum(1 for row in rows if row >= mouse_row)
+    return score if cat_turn else -score
+
+
+class AlphaBeta():
+    """
+    Iterative-deepening negamax with alpha-beta pruning, a transposition
+    table and a hard time budget per move (max_time, in seconds).
+    """
+    def __init__(self, max_time=0.1, max_depth=60, tt_size=1 << 18):
+        self.max_time = max_time
+        self.max_depth = max_depth
+        self.table = TranspositionTable(tt_size)
+        self.nodes = 0
+        self._deadline = None
+
+    def best_move(self, game):
+        move, _, _ = self.search(game._get_cats_mask(), game.mouse,
+                                 game.cat_turn)
+        return move
+
+    def search(self, cats, mouse, cat_turn):
+        """
+        Searches the position until the time budget runs out. Returns
+        (move, score, depth) for the deepest completed iteration, where
+        move is an (origin, target) pair or None if there are no moves.
+        """
+        self.nodes = 0
+        self._deadline = time.time() + self.max_time
+        self.table.new_search()
+        key = board.zobrist(cats, mouse, cat_turn)
+        moves = self._ordered_moves(cats, mouse, cat_turn, None)
+        if not moves:
+            return None, -WIN, 0
+        best = (moves[0], 0, 0)
+        for depth in range(1, self.max_depth + 1):
+            try:
+                move, score = self._search_root(cats, mouse, cat_turn, key,
+                                                depth)
+            except SearchTimeout:
+                break
+            best = (move, score, depth)
+            if abs(score) >= WIN_THRESHOLD:
+                break
+        return best
+
+    def _search_root(self, cats, mouse, cat_turn, key, depth):
+        entry = self.table.get(key)
+        moves = self._ordered_moves(cats, mouse, cat_turn,
+                                    entry[3] if entry else None)
+        alpha = -INF
+        best_move = moves[0]
+        for move in moves:
+            score = -self._negamax(*self._play(cats, mouse, cat_turn, key,
+                                               move),
+                                   depth - 1, -INF, -alpha, 1)
+            if score > alpha:
+                alpha, best_move = score, move
+        self.table.put(key, depth, alpha, EXACT, best_move)
+        return best_move, alpha
+
+    @staticmethod
+    def _play(cats, mouse, cat_turn, key, move):
+        origin, target = move
+        key ^= board.ZOBRIST_CAT_TURN
+        if cat_turn:
+            cats ^= (1 << origin) | (1 << target)
+            key ^= board.ZOBRIST_CAT[origin] ^ board.ZOBRIST_CAT[target]
+        else:
+            mouse = target
+            key ^= board.ZOBRIST_MOUSE[origin] ^ board.ZOBRIST_MOUSE[target]
+        return cats, mouse, not cat_turn, key
+
+    @staticmethod
+    def _ordered_moves(cats, mouse, cat_turn, first):
+        # Generation order is already a good default: rear cats first,
+        # which keeps the line closed, and upward steps first for the mouse
+        if cat_turn:
+            moves = board.cat_moves(cats, mouse)
+        else:
+            moves = board.mouse_moves(cats, mouse)
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _negamax(self, cats, mouse, cat_turn, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes % CLOCK_INTERVAL and\
+           time.time() > self._deadline:
+            raise SearchTimeout()
+
+        winner = board.winner(cats, mouse, cat_turn)
+        if winner is not None:
+            side = board.CAT if cat_turn else board.MOUSE
+            return WIN - ply if winner == side else ply - WIN
+        if depth <= 0:
+            return evaluate(cats, mouse, cat_turn)
+
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.table.get(key)
+        if entry is not None:
+            tt_depth, tt_score, tt_flag, tt_move, _ = entry
+            if tt_depth >= depth:
+                tt_score = _score_from_table(tt_score, ply)
+                if tt_flag == EXACT:
+                    return tt_score
+                if tt_flag == LOWER:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
+
+        best = -INF
+        best_move = None
+        for move in self._ordered_moves(cats, mouse, cat_turn, tt_move):
+            score = -self._negamax(*self._play(cats, mouse, cat_turn, key,
+                                               move),
+                                   depth - 1, -beta, -alpha, ply + 1)
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.put(key, depth, _score_to_table(best, ply), flag,
+                       best_move)
+        return best
+
+
+def _score_to_table(score, ply):
+    # Win scores are stored relative to the node, not to the root
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
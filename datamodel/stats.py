@@ -0,0 +1,156 @@
+"""
+Rebuild of the per-user statistics of UserStats.
+
+UserStats is kept up to date as games are written (see
+Game._record_stats()); this recomputes its game counters from scratch
+out of Game and ArchivedGame, keeping the Elo ratings. The id ranges of
+both tables are split into chunks that a pool of worker processes
+aggregates with GROUP BY queries; the main process adds up the partial
+counts and replaces the table, all in one transaction that holds a lock
+on UserStats so that no game write changes statistics meanwhile.
+"""
+import functools
+import multiprocessing
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, Max, Min
+
+from datamodel.models import (ArchivedGame, Game, GameStatus, UserStats,
+                              role_stats)
+
+DEFAULT_CHUNK = 10000
+
+
+def _chunks(model, size):
+    bounds = model.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+    return [(model._meta.label, first, first + size)
+            for first in range(bounds['first'], bounds['last'] + 1, size)]
+
+
+def _add(totals, user, stats, count):
+    user_totals = totals.setdefault(user, {})
+    for field, amount in stats.items():
+        user_totals[field] = user_totals.get(field, 0) + amount * count
+
+
+def chunk_stats(chunk):
+    """
+    {user id: {field: amount}} of the games of the chunk (model label,
+    first id, end id)
+    """
+    label, first, end = chunk
+    totals = {}
+    if label == ArchivedGame._meta.label:
+        games = ArchivedGame.objects.filter(id__gte=first, id__lt=end)
+        queries = ((True, games.values('cat_user', 'winner')),
+                   (False, games.values('mouse_user', 'winner')))
+    else:
+        games = Game.objects.filter(id__gte=first, id__lt=end)
+        queries = ((True, games.values('cat_user', 'status', 'winner')),
+                   (False, games.exclude(mouse_user=None)
+                                .values('mouse_user', 'status', 'winner')))
+    for as_cat, query in queries:
+        for row in query.annotate(n=Count('id')).order_by():
+            user = row['cat_user' if as_cat else 'mouse_user']
+            status = row.get('status', GameStatus.FINISHED)
+            _add(totals, user, role_stats(as_cat, status, row['winner']),
+                 row['n'])
+    return totals
+
+
+def _all_chunks(size):
+    return _chunks(Game, size) + _chunks(ArchivedGame, size)
+
+
+def _total(results, count, progress=None):
+    totals = {}
+    for done, result in enumerate(results, 1):
+        for user, stats in result.items():
+            _add(totals, user, stats, 1)
+        if progress:
+            progress(done, count)
+    return totals
+
+
+def count_games(chunk_size=DEFAULT_CHUNK):
+    """ {user id: {field: amount}} of every live and archived game """
+    chunks = _all_chunks(chunk_size)
+    return _total(map(chunk_stats, chunks), len(chunks))
+
+
+def _init_worker():
+    # Connections inherited from the parent must not be shared
+    connections.close_all()
+
+
+def _snapshot_stats(snapshot, chunk):
+    """ chunk_stats() as seen by the PostgreSQL snapshot 'snapshot' """
+    if snapshot is None:
+        return chunk_stats(chunk)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot])
+        return chunk_stats(chunk)
+
+
+def _lock_stats(outermost):
+    """
+    Blocks every write of UserStats until the transaction ends, and with
+    them the game writes that change statistics. On PostgreSQL the
+    transaction, if 'outermost', then reads a single snapshot, exported
+    for the workers, so games archived meanwhile are neither missed nor
+    counted twice. Returns the snapshot id, or None.
+    """
+    if connection.vendor != 'postgresql':
+        # SQLite has a single writer: the delete of rebuild() locks it
+        return None
+    with connection.cursor() as cursor:
+        if outermost:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        cursor.execute('LOCK TABLE %s IN EXCLUSIVE MODE' %
+                       connection.ops.quote_name(UserStats._meta.db_table))
+        cursor.execute('SELECT pg_export_snapshot()')
+        return cursor.fetchone()[0]
+
+
+def rebuild(workers=1, chunk_size=DEFAULT_CHUNK, progress=None):
+    """
+    Recomputes UserStats with 'workers' processes, each query covering
+    'chunk_size' ids. 'progress', if given, is called with the number of
+    chunks done and the total. Returns the number of UserStats rows.
+    """
+    pool = None
+    if workers > 1:
+        # Started before the transaction: workers open their own
+        # connections and read its snapshot
+        connections.close_all()
+        pool = multiprocessing.Pool(workers, _init_worker)
+    try:
+        outermost = connection.get_autocommit()
+        with transaction.atomic():
+            snapshot = _lock_stats(outermost)
+            # Ratings depend on the order games finished in: they are kept
+            ratings = dict(UserStats.objects.values_list('user_id',
+                                                         'rating'))
+            UserStats.objects.all().delete()
+            chunks = _all_chunks(chunk_size)
+            if pool and len(chunks) > 1:
+                results = pool.imap_unordered(
+                    functools.partial(_snapshot_stats, snapshot), chunks)
+            else:
+                results = map(chunk_stats, chunks)
+            totals = _total(results, len(chunks), progress)
+            for user in ratings:
+                totals.setdefault(user, {})
+            UserStats.objects.bulk_create(
+                UserStats(user_id=user, rating=ratings.get(
+                    user, settings.ELO_INITIAL_RATING), **stats)
+                for user, stats in totals.items())
+    finally:
+        if pool:
+            pool.terminate()
+    return len(totals)
@@ -0,0 +1,259 @@
+"""
+Endgame tablebase for Mouse & Cats.
+
+Every position with four cats and the mouse on distinct dark squares is
+mapped to one byte of a flat table:
+
+    bit 7      set if the side to move wins with perfect play
+    bits 0..6  plies until the end of the game with perfect play
+    0xFF       position that cannot happen (mouse and a cat on one cell)
+
+The table is built by solve_tablebase (see management/commands) and read
+through a read-only memory map, so every worker process shares the same
+page cache instead of loading its own copy.
+"""
+import logging
+import mmap
+import os
+from itertools import combinations
+
+from django.conf import settings
+
+from datamodel import board
+
+MAGIC = b'MCTB\x00\x00\x00\x01'
+WIN_FLAG = 0x80
+DIST_MASK = 0x7F
+ILLEGAL = 0xFF
+
+N_CATS = 4
+DARK_CELLS = board.DARK_CELLS
+N_DARK = len(DARK_CELLS)
+DARK_INDEX = board.DARK_INDEX
+
+
+def _binomial(n, k):
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+# _BINOMIAL[n][k] for the colex ranking of cat sets
+_BINOMIAL = tuple(tuple(_binomial(n, k) for k in range(N_CATS + 1))
+                  for n in range(N_DARK + 1))
+N_CAT_SETS = _BINOMIAL[N_DARK][N_CATS]
+N_POSITIONS = N_CAT_SETS * N_DARK * 2
+
+
+def _rank_dark(dark):
+    """ Colex rank of a sorted tuple of N_CATS dark-square indexes """
+    rank = 0
+    for i, d in enumerate(dark):
+        rank += _BINOMIAL[d][i + 1]
+    return rank
+
+
+def _dark_of_mask(cats):
+    dark = []
+    while cats:
+        low = cats & -cats
+        dark.append(DARK_INDEX[low.bit_length() - 1])
+        cats ^= low
+    return dark
+
+
+def index(cats, mouse, cat_turn):
+    """
+    Table index of a position given as cats mask, mouse cell and side to
+    move, or None if it is outside the table (wrong number of cats or a
+    piece on a light square). It is a dense form of board.canonical_key:
+    every ordering of the same four cats maps to one entry.
+    """
+    if not board.is_dark(mouse) or cats & ~board.DARK:
+        return None
+    dark = _dark_of_mask(cats)
+    if len(dark) != N_CATS:
+        return None
+    return ((_rank_dark(dark) * N_DARK + DARK_INDEX[mouse]) << 1) |\
+        bool(cat_turn)
+
+
+def _entry(wins, distance):
+    return (WIN_FLAG if wins else 0) | distance
+
+
+def _solve_position(table, cats, mouse, cat_turn):
+    winner = board.winner(cats, mouse, cat_turn)
+    side = board.CAT if cat_turn else board.MOUSE
+    if winner is not None:
+        return _entry(winner == side, 0)
+    if cat_turn:
+        moves = board.cat_moves(cats, mouse)
+        children = [index(cats ^ (1 << o) ^ (1 << t), mouse, False)
+                    for o, t in moves]
+    else:
+        moves = board.mouse_moves(cats, mouse)
+        children = [index(cats, t, True) for _, t in moves]
+    best_win = None
+    longest_loss = 0
+    for child in children:
+        value = table[child]
+        if value & WIN_FLAG:
+            longest_loss = max(longest_loss, value & DIST_MASK)
+        elif best_win is None or value < best_win:
+            best_win = value
+    if best_win is not None:
+        return _entry(True, best_win + 1)
+    return _entry(False, longest_loss + 1)
+
+
+def solve(progress=None, min_row=0):
+    """
+    Solves every position of the game and returns the table as a
+    bytearray of N_POSITIONS entries. With 'min_row', only the cat sets
+    with every cat at that row or beyond are solved, the rest of the table
+    is left ILLEGAL; cats never move back, so those sets are solved
+    exactly.
+
+    Cats only move forward, so each cat move raises the sum of the cat
+    rows by one and the game graph has no cycles. Cat sets are therefore
+    solved backwards from the most advanced ones: the children of a cat
+    move belong to a set that is already solved, and the children of a
+    mouse move keep the same cats with the cats to move, which is solved
+    first.
+    'progress', if given, is called as progress(done, total) after each
+    cat set.
+    """
+    table = bytearray([ILLEGAL]) * N_POSITIONS
+
+    def rows_sum(dark):
+        return sum(DARK_CELLS[d] // board.WIDTH for d in dark)
+
+    cat_rows = [d for d in range(N_DARK)
+                if DARK_CELLS[d] // board.WIDTH >= min_row]
+    cat_sets = sorted(combinations(cat_rows, N_CATS), key=rows_sum,
+                      reverse=True)
+    for done, dark in enumerate(cat_sets, 1):
+        cats = board.cells_mask(*(DARK_CELLS[d] for d in dark))
+        base = _rank_dark(dark) * N_DARK
+        for cat_turn in (True, False):
+            for mouse_dark, mouse in enumerate(DARK_CELLS):
+                if cats >> mouse & 1:
+                    continue
+                table[((base + mouse_dark) << 1) | cat_turn] =\
+                    _solve_position(table, cats, mouse, cat_turn)
+        if progress:
+            progress(done, len(cat_sets))
+    return table
+
+
+def write(table, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(table)
+    os.replace(tmp_path, path)
+
+
+class Tablebase():
+    """
+    Read-only view of a solved table. The file is memory mapped, so
+    probing only touches the pages that are actually read.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC or\
+           len(self._map) != len(MAGIC) + N_POSITIONS:
+            self._map.close()
+            raise ValueError('Not a Mouse & Cats tablebase: ' + path)
+
+    def close(self):
+        self._map.close()
+
+    def probe(self, cats, mouse, cat_turn):
+        """
+        (side to move wins, plies to the end) for a position, or None if
+        the position is not in the table.
+        """
+        idx = index(cats, mouse, cat_turn)
+        if idx is None:
+            return None
+        value = self._map[len(MAGIC) + idx]
+        if value == ILLEGAL:
+            return None
+        return bool(value & WIN_FLAG), value & DIST_MASK
+
+    def outcome(self, game):
+        """
+        (winner, plies) of 'game' with perfect play from both sides, where
+        winner is board.CAT or board.MOUSE; None if not in the table.
+        """
+        result = self.probe(game._get_cats_mask(), game.mouse,
+                            game.cat_turn)
+        if result is None:
+            return None
+        wins, distance = result
+        if wins == game.cat_turn:
+            return board.CAT, distance
+        return board.MOUSE, distance
+
+    def best_move(self, game):
+        """
+        Best (origin, target) for the side to move in 'game': the fastest
+        win if there is one, otherwise the longest resistance. None if the
+        position is not in the table or there are no moves.
+        """
+        cats = game._get_cats_mask()
+        mouse = game.mouse
+        best = None
+        best_key = None
+        for origin, target in game.legal_moves():
+            if game.cat_turn:
+                result = self.probe(cats ^ (1 << origin) ^ (1 << target),
+                                    mouse, False)
+            else:
+                result = self.probe(cats, target, True)
+            if result is None:
+                return None
+            opponent_wins, distance = result
+            # Prefer moves that leave the opponent lost, soonest first
+            key = (opponent_wins, distance if not opponent_wins
+                   else -distance)
+            if best_key is None or key < best_key:
+                best, best_key = (origin, target), key
+        return best
+
+
+logger = logging.getLogger(__name__)
+
+_tablebase = None
+# (path, modification time) of a file that could not be opened
+_unreadable = None
+
+
+def get_tablebase():
+    """
+    Process-wide Tablebase opened from settings.TABLEBASE_PATH, or None if
+    the table has not been generated or cannot be read. An unreadable file
+    is logged once and retried only after it changes.
+    """
+    global _tablebase, _unreadable
+    if _tablebase is None:
+        path = settings.TABLEBASE_PATH
+        try:
+            key = (path, os.stat(path).st_mtime)
+        except OSError:
+            return None
+        if key == _unreadable:
+            return None
+        try:
+            _tablebase = Tablebase(path)
+        except (OSError, ValueError) as err:
+            logger.error('Tablebase not loaded: %s', err)
+            _unreadable = key
+            return None
+    return _tablebase
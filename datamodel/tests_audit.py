@@ -0,0 +1,87 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from . import audit, board, movelog, replay, tests
+from .models import Game, Move
+from .replay import START, Position
+from .tests_replay import PLIES
+
+
+def encode(plies):
+    return bytes(movelog.encode(*ply) for ply in plies)
+
+
+class AuditTests(tests.BaseModelTest):
+    def test1(self):
+        """ Primera jugada ilegal de cada partida """
+        logs = [
+            encode(PLIES),
+            b'',
+            # Turno equivocado
+            encode([movelog.Ply(False, 59, 50)]),
+            # Gato que no está en la casilla de origen
+            encode(PLIES[:2] + [movelog.Ply(True, 20, 29)]),
+            # Ratón que intenta ocupar la casilla de un gato
+            encode([movelog.Ply(True, 6, 15), movelog.Ply(False, 59, 52),
+                    movelog.Ply(True, 15, 22), movelog.Ply(False, 52, 43),
+                    movelog.Ply(True, 22, 29), movelog.Ply(False, 43, 36),
+                    movelog.Ply(True, 0, 9), movelog.Ply(False, 36, 29)]),
+            # Gato que retrocede
+            encode(PLIES[:2] + [movelog.Ply(True, 9, 0)]),
+        ]
+        self.assertEqual(list(audit.first_illegal_logs(logs)),
+                         [0, 0, 1, 3, 8, 3])
+
+    def test2(self):
+        """ Jugadas fuera del tablero y tras el final de la partida """
+        cat = [[True, False], [True, True]]
+        origin = [[6, 59], [0, 2]]
+        target = [[15, 68], [-9, 11]]
+        self.assertEqual(list(audit.first_illegal(cat, origin, target,
+                                                  [2, 2])), [2, 1])
+        # Ratón bloqueado en la esquina: no puede haber más jugadas
+        start = audit.START._replace(cats=(1 << 54) | (1 << 61) | 1 | 4,
+                                     mouse=63, cat_turn=False)
+        self.assertEqual(list(audit.first_illegal([[False]], [[63]],
+                                                  [[54]], [1], start)),
+                         [1])
+
+    def test3(self):
+        """ Auditoría de los juegos guardados """
+        game = Game.objects.create(cat_user=self.users[0],
+                                   mouse_user=self.users[1])
+        Move.objects.create(game=game, player=self.users[0], origin=0,
+                            target=9)
+        broken = Game.objects.create(cat_user=self.users[0],
+                                     mouse_user=self.users[1])
+        Game.objects.filter(id=broken.id).update(
+            move_log=encode([movelog.Ply(True, 0, 9),
+                             movelog.Ply(True, 2, 11)]))
+        out = StringIO()
+        call_command('audit_games', chunk_size=1, stdout=out)
+        self.assertIn('Game %d: illegal ply 2' % broken.id, out.getvalue())
+        self.assertIn('2 games checked, 1 with illegal moves',
+                      out.getvalue())
+
+    def test4(self):
+        """ Cada juego se audita desde su propia posición inicial """
+        edited = Position(board.cells_mask(9, 2, 4, 6), 61, False)
+        starts = audit.unpack_starts([replay.pack(START),
+                                      replay.pack(edited)])
+        self.assertEqual([int(c) for c in starts.cats],
+                         [START.cats, edited.cats])
+        self.assertEqual(list(starts.mouse), [59, 61])
+        log = encode([movelog.Ply(False, 61, 52), movelog.Ply(True, 9, 16)])
+        self.assertEqual(list(audit.first_illegal_logs([log, log], starts)),
+                         [1, 0])
+
+        game = Game.objects.create(cat_user=self.users[0],
+                                   mouse_user=self.users[1], cat1=9,
+                                   mouse=61, cat_turn=False)
+        Move.objects.create(game=game, player=self.users[1], origin=61,
+                            target=52)
+        out = StringIO()
+        call_command('audit_games', stdout=out)
+        self.assertIn('1 games checked, 0 with illegal moves',
+                      out.getvalue())
@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase
+
+from . import board, movelog
+from .models import Game
+
+
+class BoardEngineTests(SimpleTestCase):
+    def test1(self):
+        """ Casillas válidas del tablero """
+        for cell in [0, 2, 9, 11, 54, 63]:
+            self.assertTrue(board.is_dark(cell))
+        for cell in [-1, 1, 7, 8, 26, 56, 64]:
+            self.assertFalse(board.is_dark(cell))
+
+    def test2(self):
+        """ Pasos diagonales de gatos sin salirse por los bordes """
+        self.assertEqual(board.cat_steps(board.bit(0)), board.bit(9))
+        self.assertEqual(board.cat_steps(board.bit(15)), board.bit(22))
+        self.assertEqual(board.cat_steps(board.bit(20)),
+                         board.cells_mask(27, 29))
+        self.assertEqual(board.cat_steps(board.bit(57)), 0)
+
+    def test3(self):
+        """ Pasos diagonales del ratón sin salirse por los bordes """
+        self.assertEqual(board.mouse_steps(board.bit(43)),
+                         board.cells_mask(34, 36, 50, 52))
+        self.assertEqual(board.mouse_steps(board.bit(63)), board.bit(54))
+        self.assertEqual(board.mouse_steps(board.bit(0)), board.bit(9))
+
+    def test4(self):
+        """ Validación de movimientos de gatos y ratón """
+        cats = board.cells_mask(0, 2, 4, 6)
+        self.assertTrue(board.valid_cat_move(cats, 59, 2, 11))
+        self.assertFalse(board.valid_cat_move(cats, 59, 2, 10))
+        self.assertFalse(board.valid_cat_move(cats, 59, 9, 18))
+        self.assertFalse(board.valid_cat_move(cats, 11, 2, 11))
+        self.assertTrue(board.valid_mouse_move(cats, 59, 59, 50))
+        self.assertFalse(board.valid_mouse_move(cats, 59, 61, 52))
+        self.assertFalse(board.valid_mouse_move(cats, 9, 9, 0))
+        self.assertFalse(board.valid_mouse_move(cats, 59, 59, 64))
+
+    def test5(self):
+        """ Representación del tablero como lista """
+        lst = board.to_list(board.cells_mask(0, 2, 4, 6), 59)
+        self.assertEqual(len(lst), board.BOARD_SIZE)
+        self.assertEqual([i for i, v in enumerate(lst) if v == 1],
+                         [0, 2, 4, 6])
+        self.assertEqual(lst.index(-1), 59)
+
+    def test6(self):
+        """ Tablas de vecinos precalculadas """
+        self.assertEqual(board.CAT_MOVES[20], (27, 29))
+        self.assertEqual(board.CAT_MOVES[63], ())
+        self.assertEqual(board.MOUSE_MOVES[43], (34, 36, 50, 52))
+        self.assertEqual(board.MOUSE_MOVES[0], (9,))
+
+    def test7(self):
+        """ Movimientos legales de un juego sin acceder a la bd """
+        game = Game()
+        self.assertEqual(game.legal_moves(),
+                         [(0, 9), (2, 9), (2, 11), (4, 11), (4, 13),
+                          (6, 13), (6, 15)])
+        self.assertTrue(game.is_legal(2, 11))
+        self.assertFalse(game.is_legal(59, 50))
+        game.cat_turn = False
+        self.assertEqual(game.legal_moves(), [(59, 50), (59, 52)])
+        self.assertTrue(game.is_legal(59, 50))
+        self.assertFalse(game.is_legal(2, 11))
+
+    def test8(self):
+        """ Clave canónica independiente del orden de los gatos """
+        game1 = Game(cat1=0, cat2=2, cat3=4, cat4=6)
+        game2 = Game(cat1=6, cat2=4, cat3=0, cat4=2)
+        self.assertEqual(game1.canonical_key(), game2.canonical_key())
+        game2.cat_turn = False
+        self.assertNotEqual(game1.canonical_key(), game2.canonical_key())
+        game2.cat_turn = True
+        game2.mouse = 61
+        self.assertNotEqual(game1.canonical_key(), game2.canonical_key())
+
+    def test9(self):
+        """ Codificación de movimientos en un byte """
+        plies = [(True, 0, 9), (False, 59, 50), (True, 9, 16),
+                 (False, 50, 41), (False, 41, 50), (True, 54, 63)]
+        log = b''
+        for ply in plies:
+            log = movelog.append(log, *ply)
+        self.assertEqual(len(log), len(plies))
+        self.assertEqual(movelog.decode(log), plies)
+        self.assertEqual(movelog.decode(None), [])
+        with self.assertRaises(ValueError):
+            movelog.encode(True, 0, 18)
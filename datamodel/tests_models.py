@@ -243,10 +243,10 @@ class CounterModelTests(TestCase):
 
         for i in [3, 4]:
             Counter.objects.inc()
-            n = Counter.objects.get(value=i)
-            self.assertEqual(n.value, i)
-            with self.assertRaisesRegex(ValidationError, tests.MSG_ERROR_NEW_COUNTER):
-                n.save()
+            self.assertEqual(Counter.objects.get_current_value(), i)
+            for n in Counter.objects.all():
+                with self.assertRaisesRegex(ValidationError, tests.MSG_ERROR_NEW_COUNTER):
+                    n.save()
 
     def test5(self):
         """ Devolución correcta del valor del contador """
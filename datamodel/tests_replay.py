@@ -0,0 +1,40 @@
+from django.test import SimpleTestCase
+
+from . import board, movelog, replay
+from .replay import Position, Replay, START
+
+PLIES = [movelog.Ply(True, 0, 9), movelog.Ply(False, 59, 50),
+         movelog.Ply(True, 2, 11), movelog.Ply(False, 50, 41),
+         movelog.Ply(True, 9, 16), movelog.Ply(False, 41, 34),
+         movelog.Ply(True, 4, 13)]
+
+
+class ReplayTests(SimpleTestCase):
+    def test1(self):
+        """ Posición en cualquier jugada con distintos intervalos """
+        expected = list(Replay(PLIES, snapshot_interval=1).positions())
+        self.assertEqual(len(expected), len(PLIES) + 1)
+        self.assertEqual(expected[0], START)
+        self.assertEqual(expected[-1], Position(
+            board.cells_mask(16, 11, 13, 6), 34, False))
+        for interval in [2, 3, 100]:
+            replay = Replay(PLIES, snapshot_interval=interval)
+            for ply in range(len(PLIES) + 1):
+                self.assertEqual(replay.position(ply), expected[ply])
+
+    def test2(self):
+        """ Secuencia de posiciones desde una jugada intermedia """
+        replay = Replay(PLIES, snapshot_interval=3)
+        self.assertEqual(list(replay.positions(5)),
+                         [replay.position(ply) for ply in range(5, 8)])
+        with self.assertRaises(IndexError):
+            replay.position(len(PLIES) + 1)
+
+    def test3(self):
+        """ Posición inicial empaquetada y deducida de las jugadas """
+        edited = Position(board.cells_mask(9, 2, 4, 6), 61, False)
+        for position in [START, edited]:
+            self.assertEqual(replay.unpack(replay.pack(position)), position)
+        end = Replay(PLIES).position(len(PLIES))
+        self.assertEqual(replay.start_of(end, PLIES), START)
+        self.assertEqual(replay.start_of(edited, []), edited)
@@ -0,0 +1,122 @@
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from . import board, bots, mcts, search
+from .models import Game, GameStatus, Move
+from .tests import BaseModelTest
+
+
+class AlphaBetaTests(SimpleTestCase):
+    def test1(self):
+        """ Encuentra la victoria inmediata de los gatos """
+        cats = board.cells_mask(45, 47, 61, 52)
+        move, score, _ = search.AlphaBeta(max_time=1).search(cats, 63, True)
+        self.assertEqual(move, (45, 54))
+        self.assertGreaterEqual(score, search.WIN_THRESHOLD)
+
+    def test2(self):
+        """ Encuentra la escapatoria del ratón """
+        cats = board.cells_mask(18, 20, 22, 27)
+        engine = search.AlphaBeta(max_time=1)
+        move, score, _ = engine.search(cats, 25, False)
+        self.assertEqual(move, (25, 16))
+        self.assertGreaterEqual(score, search.WIN_THRESHOLD)
+
+    def test3(self):
+        """ Respeta el tiempo máximo y devuelve un movimiento legal """
+        game = Game()
+        engine = search.AlphaBeta(max_time=0.05)
+        move = engine.best_move(game)
+        self.assertTrue(game.is_legal(*move))
+
+    def test4(self):
+        """ Reemplazo en la tabla de transposiciones """
+        table = search.TranspositionTable(1)
+        table.put(1, 5, 10, search.EXACT, None)
+        table.put(2, 3, 20, search.EXACT, None)
+        self.assertIsNone(table.get(2))
+        self.assertEqual(table.get(1)[1], 10)
+        table.new_search()
+        table.put(2, 3, 20, search.EXACT, None)
+        self.assertIsNone(table.get(1))
+        self.assertEqual(table.get(2)[1], 20)
+
+
+class MonteCarloTests(SimpleTestCase):
+    def test1(self):
+        """ Encuentra la victoria inmediata de los gatos """
+        engine = mcts.MonteCarlo(playouts=500, workers=1)
+        cats = board.cells_mask(45, 47, 61, 52)
+        self.assertIn(engine.search(cats, 63, True), [(45, 54), (47, 54)])
+        self.assertEqual(engine.last_stats['rollouts'], 500)
+
+    def test2(self):
+        """ Reparte los playouts entre procesos """
+        engine = mcts.MonteCarlo(playouts=101, workers=2)
+        game = Game()
+        self.assertTrue(game.is_legal(*engine.best_move(game)))
+        self.assertEqual(engine.last_stats['rollouts'], 101)
+        self.assertGreater(engine.last_stats['rollouts_per_second'], 0)
+
+    def test3(self):
+        """ Límite de tiempo """
+        engine = mcts.MonteCarlo(max_time=0.05, workers=1)
+        game = Game()
+        self.assertTrue(game.is_legal(*engine.best_move(game)))
+        self.assertLess(engine.last_stats['elapsed'], 0.5)
+
+    def test4(self):
+        """ Al menos un playout aunque el tiempo ya se haya agotado """
+        for workers in (1, 2):
+            engine = mcts.MonteCarlo(max_time=1e-9, workers=workers)
+            game = Game()
+            self.assertTrue(game.is_legal(*engine.best_move(game)))
+            self.assertGreaterEqual(engine.last_stats['rollouts'], workers)
+
+
+@override_settings(MOUSE_CAT_BOTS={'bot_test': 'alphabeta'},
+                   BOT_MOVE_TIME=0.05, TABLEBASE_PATH='/nonexistent')
+class BotTests(BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.bot = bots.get_bot_user('bot_test')
+
+    def test1(self):
+        """ El bot se une a una partida y responde a un movimiento """
+        game = Game.objects.create(cat_user=self.users[0])
+        joined = Game.objects.join_pending(self.bot)
+        self.assertEqual(joined.id, game.id)
+        self.assertEqual(joined.status, GameStatus.ACTIVE)
+
+        Move.objects.create(game=joined, player=self.users[0], origin=0,
+                            target=9)
+        self.assertEqual(list(bots.pending_replies(self.bot)), [joined])
+        move = bots.reply(joined)
+        self.assertEqual(move.player, self.bot)
+        self.assertTrue(joined.cat_turn)
+        self.assertEqual(joined.moves.count(), 2)
+        self.assertIsNone(bots.reply(joined))
+
+    def test2(self):
+        """ Dos respuestas a la vez: la segunda se descarta sin error """
+        Game.objects.create(cat_user=self.users[0])
+        game = Game.objects.join_pending(self.bot)
+        Move.objects.create(game=game, player=self.users[0], origin=0,
+                            target=9)
+        stale = Game.objects.get(id=game.id)
+        self.assertIsNotNone(bots.reply(game))
+        with self.assertLogs('datamodel.bots', 'INFO'):
+            self.assertIsNone(bots.reply(stale))
+        self.assertEqual(game.moves.count(), 2)
+
+    def test3(self):
+        """ Cada hilo usa su propio motor """
+        engine = bots.get_engine('bot_test')
+        self.assertIs(bots.get_engine('bot_test'), engine)
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(bots.get_engine('bot_test')))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], engine)
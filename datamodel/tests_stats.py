@@ -0,0 +1,145 @@
+import datetime
+import importlib
+from io import StringIO
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+
+from . import stats, tests
+from .archive import archive_batch
+from .cleanup import clean_batch
+from .models import (LEADERBOARD_CACHE_KEY, Game, GameStatus, GameWinner,
+                     Move, UserStats)
+
+
+class UserStatsTests(tests.BaseModelTest):
+    def get_stats(self):
+        return {s.user_id: tuple(getattr(s, f) for f in UserStats.FIELDS)
+                for s in UserStats.objects.all()}
+
+    def finish(self, game):
+        game.cat1, game.cat2, game.cat3, game.cat4 = 45, 47, 61, 52
+        game.mouse, game.cat_turn = 63, True
+        game.save()
+        Move.objects.create(game=game, player=game.cat_user,
+                            origin=45, target=54)
+
+    def test1(self):
+        """ Estadísticas mantenidas al crear, unirse y terminar juegos """
+        cat, mouse = self.users
+        Game.objects.create(cat_user=cat)
+        game = Game.objects.create(cat_user=cat)
+        self.assertEqual(self.get_stats(), {cat.id: (2, 0, 0, 0, 0, 0, 0)})
+        self.assertEqual(Game.objects.join_pending(mouse), game)
+        self.assertEqual(self.get_stats(),
+                         {cat.id: (2, 0, 0, 0, 0, 0, 1),
+                          mouse.id: (0, 1, 0, 0, 0, 0, 1)})
+        game = Game.objects.get(id=game.id)
+        Move.objects.create(game=game, player=cat, origin=0, target=9)
+        self.finish(game)
+        self.assertEqual(game.winner, GameWinner.CAT)
+        expected = {cat.id: (2, 0, 1, 0, 0, 0, 0),
+                    mouse.id: (0, 1, 0, 0, 0, 1, 0)}
+        self.assertEqual(self.get_stats(), expected)
+        stats_user = UserStats.objects.get(user=cat)
+        self.assertEqual((stats_user.games, stats_user.wins), (2, 1))
+        # Un movimiento rechazado no cambia las estadísticas
+        with self.assertRaisesRegex(ValidationError, tests.MSG_ERROR_MOVE):
+            Move.objects.create(game=game, player=mouse, origin=63,
+                                target=54)
+        self.assertEqual(self.get_stats(), expected)
+
+    def test2(self):
+        """ Reconstrucción, archivado y limpieza """
+        cat, mouse = self.users
+        pending = Game.objects.create(cat_user=cat)
+        Game.objects.create(cat_user=mouse, mouse_user=cat)
+        self.finish(Game.objects.create(cat_user=cat, mouse_user=mouse))
+        expected = self.get_stats()
+        archive_batch()
+        self.assertEqual(self.get_stats(), expected)
+        UserStats.objects.all().delete()
+        self.assertEqual(stats.rebuild(chunk_size=1), 2)
+        self.assertEqual(self.get_stats(), expected)
+        out = StringIO()
+        call_command('rebuild_stats', chunk=2, stdout=out)
+        self.assertIn('Statistics of 2 users rebuilt', out.getvalue())
+        self.assertEqual(self.get_stats(), expected)
+
+        Game.objects.filter(id=pending.id).update(
+            created=timezone.now() - datetime.timedelta(days=30))
+        self.assertEqual(clean_batch(pending.id, 1), 1)
+        self.assertEqual(Game.objects.filter(status=GameStatus.CREATED)
+                                     .count(), 0)
+        self.assertEqual(self.get_stats()[cat.id][:2],
+                         (expected[cat.id][0] - 1, expected[cat.id][1]))
+
+    @override_settings(ELO_K_FACTOR=32)
+    def test3(self):
+        """ Puntuación Elo al terminar un juego, ranking y clasificación """
+        cat, mouse = self.users
+        game = Game.objects.create(cat_user=cat, mouse_user=mouse)
+        self.assertEqual(UserStats.objects.rank(cat), 1)
+        self.finish(game)
+        ratings = dict(UserStats.objects.values_list('user_id', 'rating'))
+        self.assertEqual(ratings, {cat.id: 1216.0, mouse.id: 1184.0})
+        self.assertEqual(UserStats.objects.rank(cat), 1)
+        self.assertEqual(UserStats.objects.rank(mouse), 2)
+        # Guardar de nuevo un juego terminado no vuelve a puntuar
+        Game.objects.get(id=game.id).save()
+        self.assertEqual(
+            dict(UserStats.objects.values_list('user_id', 'rating')),
+            ratings)
+        # La reconstrucción conserva las puntuaciones
+        stats.rebuild()
+        self.assertEqual(
+            dict(UserStats.objects.values_list('user_id', 'rating')),
+            ratings)
+
+        cache.delete(LEADERBOARD_CACHE_KEY)
+        top = UserStats.objects.leaderboard()
+        self.assertEqual([(p['username'], p['rating'], p['wins'])
+                          for p in top],
+                         [(cat.username, 1216, 1), (mouse.username, 1184, 0)])
+        # Hasta que caduca, la clasificación se sirve de la caché
+        self.finish(Game.objects.create(cat_user=mouse, mouse_user=cat))
+        with self.assertNumQueries(0):
+            self.assertEqual(UserStats.objects.leaderboard(), top)
+        cache.delete(LEADERBOARD_CACHE_KEY)
+        self.assertEqual(UserStats.objects.leaderboard()[0]['username'],
+                         mouse.username)
+
+    def test4(self):
+        """ Guardar una instancia refrescada o antigua no descuadra nada """
+        cat, mouse = self.users
+        game = Game.objects.create(cat_user=cat)
+        stale = Game.objects.get(id=game.id)
+        Game.objects.join_pending(mouse)
+        stale.refresh_from_db()
+        stale.save()
+        expected = {cat.id: (1, 0, 0, 0, 0, 0, 1),
+                    mouse.id: (0, 1, 0, 0, 0, 0, 1)}
+        self.assertEqual(self.get_stats(), expected)
+        # Un movimiento desde una instancia refrescada
+        Move.objects.create(game=stale, player=cat, origin=0, target=9)
+        self.assertEqual(self.get_stats(), expected)
+        self.finish(Game.objects.get(id=game.id))
+        self.assertEqual(self.get_stats(),
+                         {cat.id: (1, 0, 1, 0, 0, 0, 0),
+                          mouse.id: (0, 1, 0, 0, 0, 1, 0)})
+
+    def test5(self):
+        """ Estadísticas de los juegos anteriores a la migración """
+        cat, mouse = self.users
+        Game.objects.create(cat_user=cat)
+        self.finish(Game.objects.create(cat_user=cat, mouse_user=mouse))
+        expected = self.get_stats()
+        UserStats.objects.all().delete()
+        migration = importlib.import_module(
+            'datamodel.migrations.0017_userstats')
+        migration.fill_stats(apps, None)
+        self.assertEqual(self.get_stats(), expected)
@@ -0,0 +1,118 @@
+import os
+import random
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from . import board, tablebase
+from .models import Game
+
+
+class TablebaseTests(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.table = bytearray(tablebase.N_POSITIONS)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test1(self):
+        """ Índices únicos y dentro de rango """
+        cats = board.cells_mask(0, 2, 4, 6)
+        seen = set()
+        for mouse in tablebase.DARK_CELLS:
+            for cat_turn in (True, False):
+                idx = tablebase.index(cats, mouse, cat_turn)
+                self.assertTrue(0 <= idx < tablebase.N_POSITIONS)
+                seen.add(idx)
+        self.assertEqual(len(seen), 2 * tablebase.N_DARK)
+        last = board.cells_mask(*tablebase.DARK_CELLS[-4:])
+        self.assertEqual(tablebase.index(last, 63, True),
+                         tablebase.N_POSITIONS - 1)
+
+    def test2(self):
+        """ Posiciones fuera de la tabla """
+        self.assertIsNone(tablebase.index(board.cells_mask(0, 2, 4), 59,
+                                          True))
+        self.assertIsNone(tablebase.index(board.cells_mask(0, 2, 4, 7), 59,
+                                          True))
+        self.assertIsNone(tablebase.index(board.cells_mask(0, 2, 4, 6), 58,
+                                          True))
+
+    def test3(self):
+        """ Lectura de resultado y mejor jugada desde el fichero """
+        game = Game(cat1=45, cat2=47, cat3=61, cat4=52, mouse=63)
+        cats = game._get_cats_mask()
+        self.table[tablebase.index(cats, 63, True)] = tablebase.WIN_FLAG | 1
+        for origin, target in game.legal_moves():
+            child = tablebase.index(cats ^ (1 << origin) ^ (1 << target),
+                                    63, False)
+            self.table[child] = tablebase.WIN_FLAG | 5
+        won = cats ^ board.cells_mask(45, 54)
+        self.table[tablebase.index(won, 63, False)] = 0
+        tablebase.write(self.table, self.path)
+
+        tb = tablebase.Tablebase(self.path)
+        self.assertEqual(tb.outcome(game), (board.CAT, 1))
+        self.assertEqual(tb.best_move(game), (45, 54))
+        self.assertIsNone(tb.outcome(Game(cat1=0, cat2=0)))
+        tb.close()
+
+    def test4(self):
+        """ Fichero que no es una tabla """
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        with self.assertRaises(ValueError):
+            tablebase.Tablebase(self.path)
+        # Los bots juegan sin tabla, avisando una sola vez
+        with override_settings(TABLEBASE_PATH=self.path):
+            with mock.patch.object(tablebase, '_unreadable', None):
+                with self.assertLogs('datamodel.tablebase', 'ERROR') as logs:
+                    self.assertIsNone(tablebase.get_tablebase())
+                    self.assertIsNone(tablebase.get_tablebase())
+        self.assertEqual(len(logs.records), 1)
+
+    def test5(self):
+        """ La tabla coincide con una búsqueda exhaustiva """
+        memo = {}
+
+        def search(cats, mouse, cat_turn):
+            key = (cats, mouse, cat_turn)
+            if key not in memo:
+                winner = board.winner(cats, mouse, cat_turn)
+                if winner is not None:
+                    memo[key] = ((winner == board.CAT) == cat_turn, 0)
+                    return memo[key]
+                if cat_turn:
+                    children = [search(cats ^ (1 << o) ^ (1 << t), mouse,
+                                       False)
+                                for o, t in board.cat_moves(cats, mouse)]
+                else:
+                    children = [search(cats, t, True)
+                                for _, t in board.mouse_moves(cats, mouse)]
+                wins = [d for won, d in children if not won]
+                if wins:
+                    memo[key] = (True, min(wins) + 1)
+                else:
+                    memo[key] = (False, max(d for _, d in children) + 1)
+            return memo[key]
+
+        table = tablebase.solve(min_row=4)
+        tablebase.write(table, self.path)
+        tb = tablebase.Tablebase(self.path)
+        rng = random.Random(7)
+        top = [c for c in tablebase.DARK_CELLS if c >= 4 * board.WIDTH]
+        positions = [(board.cells_mask(32, 34, 36, 38), 57, True),
+                     (board.cells_mask(45, 47, 61, 52), 63, True)]
+        while len(positions) < 200:
+            cells = rng.sample(top, 5)
+            positions.append((board.cells_mask(*cells[:4]), cells[4],
+                              rng.random() < 0.5))
+        for cats, mouse, cat_turn in positions:
+            self.assertEqual(tb.probe(cats, mouse, cat_turn),
+                             search(cats, mouse, cat_turn))
+        # Fuera de las filas resueltas la tabla no tiene datos
+        self.assertIsNone(tb.probe(board.cells_mask(0, 2, 4, 6), 59, True))
+        tb.close()
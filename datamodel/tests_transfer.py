@@ -0,0 +1,121 @@
+import datetime
+import os
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from . import tests, transfer
+from .archive import archive_batch
+from .models import Game, GameStatus, Move
+
+
+class TransferTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        Game.objects.create(cat_user=self.users[0])
+        game = Game.objects.create(cat_user=self.users[0],
+                                   mouse_user=self.users[1])
+        for player, origin, target in [(0, 0, 9), (1, 59, 50), (0, 2, 11)]:
+            Move.objects.create(game=game, player=self.users[player],
+                                origin=origin, target=target)
+
+    def snapshot(self):
+        return [([getattr(game, f) for f in transfer.GAME_FIELDS],
+                 game.cat_user.username, bytes(game.move_log),
+                 game.zobrist,
+                 [(m.ply, m.origin, m.target, m.player_id, m.date)
+                  for m in game.moves])
+                for game in Game.objects.order_by('id')]
+
+    def test1(self):
+        """ Exportación e importación en JSONL y en binario """
+        before = self.snapshot()
+        records = list(transfer.export_records(chunk_size=1))
+        self.assertEqual([len(r['moves']) for r in records], [0, 3])
+        self.assertEqual(records[1]['moves'][1][:3], [59, 50, False])
+        for write, read, stream in [
+                (transfer.write_jsonl, transfer.read_jsonl, StringIO()),
+                (transfer.write_binary, transfer.read_binary, BytesIO())]:
+            self.assertEqual(write(records, stream), 2)
+            stream.seek(0)
+            Game.objects.all().delete()
+            self.assertEqual(transfer.import_records(read(stream),
+                                                     batch_size=1), 2)
+            self.assertEqual(self.snapshot(), before)
+
+    def test2(self):
+        """ Comandos de exportación e importación """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.bin')
+            call_command('export_games', path, format='binary',
+                         status=[GameStatus.ACTIVE], stderr=StringIO())
+            call_command('import_games', path, stdout=StringIO())
+        games = Game.objects.filter(status=GameStatus.ACTIVE)\
+                            .order_by('id')
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[1].history(), games[0].history())
+        self.assertEqual(games[1].moves.count(), 3)
+        self.assertEqual(Game.objects.count(), 3)
+
+    def test3(self):
+        """ Los juegos importados no reutilizan ids de juegos archivados """
+        records = list(transfer.export_records())
+        game = Game.objects.order_by('id').last()
+        Game.objects.filter(id=game.id).update(status=GameStatus.FINISHED)
+        self.assertEqual(archive_batch(), (1, game.id))
+        Game.objects.all().delete()
+        self.assertEqual(transfer.import_records(records), 2)
+        self.assertGreater(Game.objects.order_by('id').first().id, game.id)
+        self.assertGreater(Game.objects.create(cat_user=self.users[0]).id,
+                           game.id + 2)
+        imported = Game.objects.exclude(mouse_user=None).get()
+        Game.objects.filter(id=imported.id).update(
+            status=GameStatus.FINISHED)
+        self.assertEqual(archive_batch(), (1, imported.id))
+
+    def test4(self):
+        """ Movimientos anteriores a la creación del juego """
+        game = Game.objects.order_by('id').last()
+        Game.objects.filter(id=game.id).update(
+            created=timezone.now() + datetime.timedelta(days=3))
+        before = self.snapshot()
+        stream = BytesIO()
+        transfer.write_binary(transfer.export_records(), stream)
+        stream.seek(0)
+        Game.objects.all().delete()
+        transfer.import_records(transfer.read_binary(stream))
+        self.assertEqual(self.snapshot(), before)
+
+    def test5(self):
+        """ Movimientos de juegos borrados entre las dos consultas """
+        games = [Game(id=2), Game(id=5)]
+        moves = [(1, 0, 9), (2, 0, 9), (3, 2, 11), (5, 59, 50)]
+        merged = transfer._merge(iter(games), iter(moves))
+        self.assertEqual([(game.id, rows) for game, rows in merged],
+                         [(2, [(2, 0, 9)]), (5, [(5, 59, 50)])])
+
+    def test6(self):
+        """ Juegos creados entre dos lotes de la importación """
+        records = list(transfer.export_records())
+        created = []
+
+        def progress(count):
+            created.append(Game.objects.create(cat_user=self.users[0]).id)
+
+        self.assertEqual(transfer.import_records(records, batch_size=1,
+                                                 progress=progress), 2)
+        self.assertEqual(Game.objects.count(), 6)
+        ids = Game.objects.order_by('id').values_list('id', flat=True)
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(ids[5], created[-1])
+
+    def test7(self):
+        """ Ficheros binarios de otra versión del formato """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.bin')
+            with open(path, 'wb') as stream:
+                stream.write(transfer.MAGIC[:4] + b'\x00\x00\x00\x01')
+            with self.assertRaisesMessage(ValueError, 'version'):
+                call_command('import_games', path, stdout=StringIO())
@@ -0,0 +1,284 @@
+"""
+Streaming export and import of games with their moves.
+
+A game travels as a record: a dict with the players' usernames, the Game
+columns and its moves as [origin, target, cat, date] lists in ply order.
+Records are stored either as JSON lines or in a binary format:
+
+    MAGIC, then per game:
+    header    struct RECORD ('<BbB5BdH'): status, winner (-1 for none),
+              cat_turn, cat1..cat4, mouse, created (POSIX time) and the
+              number of moves
+    players   cat and mouse username, each as one length byte and UTF-8
+              (length 0 for no mouse)
+    moves     one datamodel.movelog byte per ply, then per ply the days
+              from 'created' to the move as an int32 (negative for games
+              older than their 'created', which migration 0016 set for
+              existing games)
+
+Exports walk Game and Move with two server-side cursors ordered by game
+id and merge them, so memory use does not grow with the number of games.
+Imports are written with bulk_create, one transaction per batch of games,
+with ids reserved from the Game id sequence.
+"""
+import datetime
+import json
+import struct
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from datamodel import movelog, replay
+from datamodel.models import Game, Move, UserStats
+
+MAGIC = b'MCGX\x00\x00\x00\x02'
+RECORD = struct.Struct('<BbB5BdH')
+DAYS = struct.Struct('<i')
+
+GAME_FIELDS = ('status', 'winner', 'cat1', 'cat2', 'cat3', 'cat4', 'mouse',
+               'cat_turn')
+
+
+def export_records(games=None, chunk_size=2000):
+    """ Generator of the record of every game of the queryset 'games' """
+    if games is None:
+        games = Game.objects.all()
+    games = games.select_related('cat_user', 'mouse_user')\
+                 .only('id', 'created', 'cat_user__username',
+                       'mouse_user__username', *GAME_FIELDS)\
+                 .order_by('id')
+    moves = Move.objects.filter(game__in=games.values('id'))\
+                        .order_by('game_id', 'ply')\
+                        .values_list('game_id', 'origin', 'target',
+                                     'player_id', 'date')
+    for game, game_moves in _merge(games.iterator(chunk_size=chunk_size),
+                                   moves.iterator(chunk_size=chunk_size)):
+        record = {f: getattr(game, f) for f in GAME_FIELDS}
+        record['cat_user'] = game.cat_user.username
+        record['mouse_user'] = game.mouse_user.username\
+            if game.mouse_user_id else None
+        record['created'] = game.created.isoformat()
+        record['moves'] = [[origin, target, player_id == game.cat_user_id,
+                            date.isoformat()]
+                           for _, origin, target, player_id, date
+                           in game_moves]
+        yield record
+
+
+def _merge(games, moves):
+    """
+    Pairs each game with its moves, from iterators of games and of move
+    rows (game id first) both ordered by game id. They are separate
+    queries: moves of a game deleted or archived in between are skipped.
+    """
+    move = next(moves, None)
+    for game in games:
+        while move is not None and move[0] < game.id:
+            move = next(moves, None)
+        game_moves = []
+        while move is not None and move[0] == game.id:
+            game_moves.append(move)
+            move = next(moves, None)
+        yield game, game_moves
+
+
+def write_jsonl(records, stream):
+    """ Writes 'records' to the text 'stream'; returns how many """
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+        count += 1
+    return count
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _pack_name(name):
+    data = (name or '').encode()
+    return bytes((len(data),)) + data
+
+
+def write_binary(records, stream):
+    """ Writes 'records' to the binary 'stream'; returns how many """
+    stream.write(MAGIC)
+    count = 0
+    for record in records:
+        created = parse_datetime(record['created'])
+        moves = record['moves']
+        log = bytes(movelog.encode(cat, origin, target)
+                    for origin, target, cat, _ in moves)
+        days = b''.join(DAYS.pack((parse_date(date) - created.date()).days)
+                        for _, _, _, date in moves)
+        winner = record['winner']
+        stream.write(RECORD.pack(
+            record['status'], -1 if winner is None else winner,
+            record['cat_turn'], record['cat1'], record['cat2'],
+            record['cat3'], record['cat4'], record['mouse'],
+            created.timestamp(), len(moves)))
+        stream.write(_pack_name(record['cat_user']))
+        stream.write(_pack_name(record['mouse_user']))
+        stream.write(log)
+        stream.write(days)
+        count += 1
+    return count
+
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated game file')
+    return data
+
+
+def _read_name(stream):
+    length = _read_exactly(stream, 1)[0]
+    return _read_exactly(stream, length).decode() or None
+
+
+def is_binary(head):
+    """ Whether a file starting with 'head' is in the binary format """
+    return head[:4] == MAGIC[:4]
+
+
+def read_binary(stream):
+    magic = stream.read(len(MAGIC))
+    if not is_binary(magic):
+        raise ValueError('Not a Mouse & Cats game file')
+    if magic != MAGIC:
+        raise ValueError('Unsupported game file version')
+    while True:
+        header = stream.read(RECORD.size)
+        if not header:
+            return
+        if len(header) != RECORD.size:
+            raise ValueError('Truncated game file')
+        (status, winner, cat_turn, cat1, cat2, cat3, cat4, mouse,
+         timestamp, n_moves) = RECORD.unpack(header)
+        created = datetime.datetime.fromtimestamp(timestamp,
+                                                  datetime.timezone.utc)
+        cat_user = _read_name(stream)
+        mouse_user = _read_name(stream)
+        plies = movelog.decode(_read_exactly(stream, n_moves))
+        days = _read_exactly(stream, DAYS.size * n_moves)
+        moves = []
+        for i, ply in enumerate(plies):
+            date = created.date() + datetime.timedelta(
+                days=DAYS.unpack_from(days, DAYS.size * i)[0])
+            moves.append([ply.origin, ply.target, ply.cat,
+                          date.isoformat()])
+        yield {'status': status, 'winner': None if winner < 0 else winner,
+               'cat_turn': bool(cat_turn), 'cat1': cat1, 'cat2': cat2,
+               'cat3': cat3, 'cat4': cat4, 'mouse': mouse,
+               'cat_user': cat_user, 'mouse_user': mouse_user,
+               'created': created.isoformat(), 'moves': moves}
+
+
+def _get_users(names):
+    """ {username: id} for 'names', creating the users that are missing """
+    users = dict(User.objects.filter(username__in=names)
+                             .values_list('username', 'id'))
+    missing = [name for name in names if name not in users]
+    if missing:
+        User.objects.bulk_create(User(username=name,
+                                      password=make_password(None))
+                                 for name in missing)
+        users.update(User.objects.filter(username__in=missing)
+                                 .values_list('username', 'id'))
+    return users
+
+
+def _import_batch(records):
+    names = {r['cat_user'] for r in records} |\
+        {r['mouse_user'] for r in records if r['mouse_user']}
+    games = []
+    moves = []
+    with transaction.atomic():
+        ids = _reserve_ids(len(records))
+        users = _get_users(names)
+        for game_id, record in zip(ids, records):
+            cat_user = users[record['cat_user']]
+            mouse_user = users.get(record['mouse_user'])
+            created = parse_datetime(record['created'])
+            if timezone.is_naive(created):
+                created = timezone.make_aware(created, datetime.timezone.utc)
+            game = Game(id=game_id, cat_user_id=cat_user,
+                        mouse_user_id=mouse_user, created=created,
+                        **{f: record[f] for f in GAME_FIELDS})
+            log = b''
+            for ply, (origin, target, cat, date) in\
+                    enumerate(record['moves'], 1):
+                log = movelog.append(log, cat, origin, target)
+                moves.append(Move(game_id=game_id, ply=ply, origin=origin,
+                                  target=target,
+                                  player_id=cat_user if cat else mouse_user,
+                                  date=parse_date(date)))
+            game.move_log = log
+            game.start = replay.pack(replay.start_of(
+                replay.Position(game._get_cats_mask(), game.mouse,
+                                game.cat_turn),
+                movelog.decode(log)))
+            game._compute_zobrist()
+            games.append(game)
+        # The CHECK constraints of Game and Move validate the rows
+        Game.objects.bulk_create(games)
+        Move.objects.bulk_create(moves)
+        UserStats.objects.record_all(
+            (None, game._get_stats_state()) for game in games)
+
+
+def import_records(records, batch_size=1000, progress=None):
+    """
+    Inserts the games of 'records' and their moves, creating the players
+    that do not exist yet with unusable passwords. Games get new ids from
+    the Game id sequence. 'progress', if given, is called with the number
+    of games imported after each batch. Returns that number.
+    """
+    batch = []
+    count = 0
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            _import_batch(batch)
+            count += len(batch)
+            batch = []
+            if progress:
+                progress(count)
+    if batch:
+        _import_batch(batch)
+        count += len(batch)
+        if progress:
+            progress(count)
+    return count
+
+
+def _reserve_ids(count):
+    """
+    Takes 'count' ids from the Game id sequence, so no other insert can
+    get them, now or later. Sequences never go back: the ids are above
+    those of archived and deleted games too.
+    """
+    table = Game._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)", [table, count])
+            return [row[0] for row in cursor.fetchall()]
+        # SQLite keeps the highest AUTOINCREMENT id in sqlite_sequence. The
+        # update takes the write lock until the batch commits
+        cursor.execute("UPDATE sqlite_sequence SET seq = seq + %s "
+                       "WHERE name = %s", [count, table])
+        if not cursor.rowcount:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) "
+                           "VALUES (%s, %s)", [table, count])
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s",
+                       [table])
+        last = cursor.fetchone()[0]
+    return list(range(last - count + 1, last + 1))
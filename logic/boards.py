@@ -0,0 +1,59 @@
+"""
+Cached rendering of the game board.
+
+The board fragment of mouse_cat/game.html only depends on the cells of
+the cats and the mouse, and the same positions come up again and again
+across games and polls of show_game. Each fragment is rendered once from
+mouse_cat/board.html and kept in a per-process LRU of
+settings.BOARD_LRU_SIZE positions and, if settings.BOARD_CACHE_TIMEOUT is
+set, in the Django cache shared by all processes.
+"""
+import collections
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from datamodel import board
+
+BOARD_TEMPLATE = 'mouse_cat/board.html'
+BOARD_CACHE_KEY = 'mouse_cat_board_%x'
+
+_boards = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def position_key(game):
+    """ Key of the cells of the game; the board does not show the turn """
+    return board.canonical_key(game._get_cats_mask(), game.mouse, False)
+
+
+def render_board(game):
+    """ HTML of the board of 'game', rendered once per position """
+    key = position_key(game)
+    with _lock:
+        html = _boards.get(key)
+        if html is not None:
+            _boards.move_to_end(key)
+            return html
+    html = cache.get(BOARD_CACHE_KEY % key) if settings.BOARD_CACHE_TIMEOUT\
+        else None
+    if html is None:
+        html = render_to_string(BOARD_TEMPLATE, {'board': game._get_board()})
+        if settings.BOARD_CACHE_TIMEOUT:
+            cache.set(BOARD_CACHE_KEY % key, html,
+                      settings.BOARD_CACHE_TIMEOUT)
+    html = mark_safe(html)
+    with _lock:
+        _boards[key] = html
+        while len(_boards) > settings.BOARD_LRU_SIZE:
+            _boards.popitem(last=False)
+    return html
+
+
+def clear():
+    """ Empties the per-process LRU """
+    with _lock:
+        _boards.clear()
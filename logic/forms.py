@@ -41,6 +41,8 @@ class MoveForm(forms.ModelForm):
     ----------
     Description:
         It defines the movement form, in order to get the orgin and the target
+    and the idempotency key of the submission, that makes retries of the same
+    form harmless.
     """
     origin = forms.IntegerField(validators=[
                                             MaxValueValidator(Game.MAX_CELL),
@@ -50,6 +52,8 @@ class MoveForm(forms.ModelForm):
                                             MaxValueValidator(Game.MAX_CELL),
                                             MinValueValidator(Game.MIN_CELL)
                                           ])
+    token = forms.CharField(required=False, max_length=64,
+                            widget=forms.HiddenInput)
 
     class Meta:
         model = Move
@@ -1,11 +1,27 @@
 """
 """
 
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
 from django.urls import reverse
-
-from datamodel import tests
-from datamodel.models import Game, GameStatus, Move
+from django.utils import timezone
+
+from datamodel import board, cleanup, constants, tests
+from logic import boards
+from datamodel.archive import archive_batch
+from datamodel.models import ArchivedGame, Counter, Game, GameStatus,\
+                             GameWinner, Move, MSG_ERROR_MOVE_CONFLICT,\
+                             COUNTER_CACHE_KEY, LEADERBOARD_CACHE_KEY,\
+                             UserStats
 from decimal import Decimal
 from logic.tests_services import PlayGameBaseServiceTests, SHOW_GAME_SERVICE,\
                                  SELECT_GAME_SERVICE, SHOW_GAME_TITLE
@@ -72,6 +88,316 @@ class AdditionalMoveTest(tests.BaseModelTest):
         self.assertEqual(str(move), "[cat_user_test] - Origen: 0 - Destino: 9")
 
 
+class AdditionalFinishGameTest(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+                                        cat_user=self.users[0],
+                                        mouse_user=self.users[1],
+                                        status=GameStatus.ACTIVE)
+
+    def test1(self):
+        """ Los gatos ganan al encerrar al ratón """
+        self.game.cat1, self.game.cat2 = 45, 47
+        self.game.cat3, self.game.cat4 = 61, 52
+        self.game.mouse = 63
+        self.game.save()
+        Move.objects.create(game=self.game, player=self.game.cat_user,
+                            origin=45, target=54)
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.status, GameStatus.FINISHED)
+        self.assertEqual(game.winner, GameWinner.CAT)
+        with self.assertRaisesRegex(ValidationError, tests.MSG_ERROR_MOVE):
+            Move.objects.create(game=game, player=game.mouse_user,
+                                origin=63, target=54)
+
+    def test2(self):
+        """ El ratón gana al superar a todos los gatos """
+        self.game.cat1, self.game.cat2 = 18, 20
+        self.game.cat3, self.game.cat4 = 22, 27
+        self.game.mouse = 25
+        self.game.cat_turn = False
+        self.game.save()
+        Move.objects.create(game=self.game, player=self.game.mouse_user,
+                            origin=25, target=16)
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.status, GameStatus.FINISHED)
+        self.assertEqual(game.winner, GameWinner.MOUSE)
+
+    def test3(self):
+        """ El juego sigue activo tras movimientos normales """
+        Move.objects.create(game=self.game, player=self.game.cat_user,
+                            origin=0, target=9)
+        Move.objects.create(game=self.game, player=self.game.mouse_user,
+                            origin=59, target=50)
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.status, GameStatus.ACTIVE)
+        self.assertIsNone(game.winner)
+
+
+class AdditionalPositionTest(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+                                        cat_user=self.users[0],
+                                        mouse_user=self.users[1],
+                                        status=GameStatus.ACTIVE)
+
+    def full_zobrist(self, game):
+        return board.to_signed64(board.zobrist(
+            game._get_cats_mask(), game.mouse, game.cat_turn))
+
+    def test1(self):
+        """ Hash incremental igual al calculado desde cero """
+        self.assertEqual(self.game.zobrist, self.full_zobrist(self.game))
+        moves = [
+            {"player": self.users[0], "origin": 2, "target": 11},
+            {"player": self.users[1], "origin": 59, "target": 50},
+            {"player": self.users[0], "origin": 11, "target": 18},
+        ]
+        for move in moves:
+            Move.objects.create(game=self.game, player=move["player"],
+                                origin=move["origin"], target=move["target"])
+            game = Game.objects.get(id=self.game.id)
+            self.assertEqual(game.zobrist, self.full_zobrist(game))
+
+    def test2(self):
+        """ Juegos en la misma posición y cambios fuera de movimientos """
+        other = Game.objects.create(cat_user=self.users[1],
+                                    mouse_user=self.users[0])
+        self.assertEqual(list(Game.objects.same_position(self.game)),
+                         [other])
+        other.cat1, other.cat2 = 2, 0
+        other.save()
+        self.assertEqual(list(Game.objects.same_position(self.game)),
+                         [other])
+        other.mouse = 61
+        other.save()
+        self.assertEqual(list(Game.objects.same_position(self.game)), [])
+
+    def test3(self):
+        """ Historial completo desde el registro binario del juego """
+        moves = [
+            {"player": self.users[0], "origin": 2, "target": 11},
+            {"player": self.users[1], "origin": 59, "target": 50},
+            {"player": self.users[0], "origin": 11, "target": 18},
+        ]
+        for move in moves:
+            Move.objects.create(game=self.game, player=move["player"],
+                                origin=move["origin"], target=move["target"])
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(len(bytes(game.move_log)), len(moves))
+        self.assertEqual(
+            [(ply.origin, ply.target) for ply in game.history()],
+            [(move["origin"], move["target"]) for move in moves])
+        self.assertEqual([ply.cat for ply in game.history()],
+                         [True, False, True])
+
+    def test4(self):
+        """ La reproducción parte de la posición inicial editada """
+        self.game.cat1, self.game.mouse = 9, 61
+        self.game.cat_turn = False
+        self.game.save()
+        Move.objects.create(game=self.game, player=self.users[1],
+                            origin=61, target=52)
+        Move.objects.create(game=self.game, player=self.users[0],
+                            origin=9, target=16)
+        game = Game.objects.get(id=self.game.id)
+        replay = game.replay()
+        self.assertEqual(replay.position(0).mouse, 61)
+        self.assertEqual(tuple(replay.position(2)),
+                         (game._get_cats_mask(), game.mouse, game.cat_turn))
+        Game.objects.filter(id=game.id).update(status=GameStatus.FINISHED,
+                                               winner=GameWinner.CAT)
+        archive_batch()
+        archived = ArchivedGame.objects.get(id=game.id)
+        self.assertEqual(list(archived.replay().positions()),
+                         list(replay.positions()))
+
+
+class AdditionalMoveConflictTest(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+                                        cat_user=self.users[0],
+                                        mouse_user=self.users[1],
+                                        status=GameStatus.ACTIVE)
+
+    def test1(self):
+        """ Dos movimientos sobre la misma versión del juego """
+        stale = Game.objects.get(id=self.game.id)
+        Move.objects.create(game=self.game, player=self.users[0],
+                            origin=0, target=9)
+        self.assertEqual(self.game.version, stale.version + 1)
+        with self.assertRaisesRegex(ValidationError, MSG_ERROR_MOVE_CONFLICT):
+            Move.objects.create(game=stale, player=self.users[0],
+                                origin=2, target=11)
+        self.assertEqual(self.game.moves.count(), 1)
+        self.assertEqual(self.get_array_positions(stale), [0, 2, 4, 6, 59])
+        self.assertTrue(stale.cat_turn)
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(self.get_array_positions(game), [9, 2, 4, 6, 59])
+        self.assertEqual(len(game.history()), 1)
+
+    def test2(self):
+        """ Un juego recargado vuelve a aceptar movimientos """
+        stale = Game.objects.get(id=self.game.id)
+        Move.objects.create(game=self.game, player=self.users[0],
+                            origin=0, target=9)
+        stale.refresh_from_db()
+        Move.objects.create(game=stale, player=self.users[1],
+                            origin=59, target=50)
+        self.assertEqual(self.game.moves.count(), 2)
+
+
+class AdditionalConstraintTest(tests.BaseModelTest):
+    def test1(self):
+        """ Escrituras en bloque que rompen las reglas del juego """
+        game = Game.objects.create(cat_user=self.users[0])
+        updates = [{"cat1": 1}, {"mouse": 64}, {"status": GameStatus.ACTIVE},
+                   {"mouse_user": self.users[1]},
+                   {"winner": GameWinner.CAT}]
+        for update in updates:
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    Game.objects.filter(id=game.id).update(**update)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Game.objects.bulk_create([Game(cat_user=self.users[0],
+                                               cat2=3)])
+
+    def test2(self):
+        """ Escrituras en bloque válidas """
+        games = Game.objects.bulk_create(
+            [Game(cat_user=self.users[0]),
+             Game(cat_user=self.users[0], mouse_user=self.users[1],
+                  status=GameStatus.ACTIVE)])
+        self.assertEqual(len(games), 2)
+        Game.objects.filter(cat_user=self.users[0],
+                            status=GameStatus.ACTIVE).update(
+            status=GameStatus.FINISHED, winner=GameWinner.MOUSE)
+        self.assertEqual(Game.objects.filter(winner=GameWinner.MOUSE)
+                         .count(), 1)
+
+
+class AdditionalArchiveTest(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.games = []
+        for _ in range(3):
+            game = Game.objects.create(cat_user=self.users[0],
+                                       mouse_user=self.users[1])
+            Move.objects.create(game=game, player=self.users[0],
+                                origin=0, target=9)
+            Move.objects.create(game=game, player=self.users[1],
+                                origin=59, target=50)
+            self.games.append(game)
+        Game.objects.filter(id__in=[g.id for g in self.games[:2]])\
+                    .update(status=GameStatus.FINISHED)
+
+    def test1(self):
+        """ Archivado por lotes de los juegos terminados """
+        self.assertEqual(archive_batch(size=1), (1, self.games[0].id))
+        self.assertEqual(archive_batch(size=1), (1, self.games[1].id))
+        self.assertEqual(archive_batch(size=1), (0, None))
+        self.assertEqual(list(Game.objects.all()), [self.games[2]])
+        self.assertEqual(Move.objects.count(), 2)
+        archived = ArchivedGame.objects.get(id=self.games[0].id)
+        self.assertEqual([(p.cat, p.origin, p.target)
+                          for p in archived.history()],
+                         [(True, 0, 9), (False, 59, 50)])
+        self.assertEqual(archived.replay().position(2).mouse, 50)
+
+    def test2(self):
+        """ Historial de un juego archivado y antigüedad mínima """
+        call_command('archive_games', days=1, sleep=0, stdout=StringIO())
+        self.assertFalse(ArchivedGame.objects.exists())
+        out = StringIO()
+        call_command('archive_games', days=0, batch=1, sleep=0, stdout=out)
+        self.assertIn('2 games archived', out.getvalue())
+        page = Move.objects.history(self.games[0].id, size=1)
+        self.assertEqual([(m.ply, m.origin, m.player_id) for m in page],
+                         [(2, 59, self.users[1].id)])
+        page = Move.objects.history(self.games[0], before=2)
+        self.assertEqual([(m.ply, m.target) for m in page], [(1, 9)])
+
+
+class AdditionalJoinGameTest(tests.BaseModelTest):
+    def test1(self):
+        """ Cada jugador reclama un juego distinto, el más reciente """
+        third = self.get_or_create_user("third_user_test")
+        old = Game.objects.create(cat_user=self.users[0])
+        new = Game.objects.create(cat_user=self.users[0])
+        game = Game.objects.join_pending(self.users[1])
+        self.assertEqual(game.id, new.id)
+        self.assertEqual(game.status, GameStatus.ACTIVE)
+        game = Game.objects.join_pending(third)
+        self.assertEqual(game.id, old.id)
+        self.assertIsNone(Game.objects.join_pending(third))
+        self.assertIsNone(Game.objects.join_pending(self.users[0]))
+        old = Game.objects.get(id=old.id)
+        self.assertEqual(old.mouse_user, third)
+        self.assertEqual(old.status, GameStatus.ACTIVE)
+
+    def test2(self):
+        """ Un juego reclamado por otro entre lectura y escritura """
+        rival = self.get_or_create_user("rival_user_test")
+        old = Game.objects.create(cat_user=self.users[0])
+        new = Game.objects.create(cat_user=self.users[0])
+        first = QuerySet.first
+
+        def racing_first(queryset):
+            game = first(queryset)
+            if game is not None and game.id == new.id:
+                Game.objects.filter(id=new.id).update(
+                    mouse_user=rival, status=GameStatus.ACTIVE)
+            return game
+
+        with mock.patch.object(QuerySet, 'first', racing_first):
+            game = Game.objects.join_pending(self.users[1])
+        self.assertEqual(game.id, old.id)
+        self.assertEqual(Game.objects.get(id=new.id).mouse_user, rival)
+        self.assertEqual(Game.objects.get(id=old.id).mouse_user,
+                         self.users[1])
+
+
+class AdditionalCounterTest(TestCase):
+    def setUp(self):
+        Counter.objects.flush()
+        Counter.objects.all().delete()
+
+    def test1(self):
+        """ Incrementos repartidos entre varias filas """
+        with override_settings(COUNTER_SHARDS=4):
+            for i in range(1, 21):
+                self.assertEqual(Counter.objects.inc(), i)
+        self.assertLessEqual(Counter.objects.count(), 4)
+        self.assertEqual(Counter.objects.get_current_value(), 20)
+
+    def test2(self):
+        """ Escritura diferida de los incrementos """
+        with override_settings(COUNTER_FLUSH_INTERVAL=3600):
+            Counter.objects.flush()
+            for i in range(1, 4):
+                self.assertEqual(Counter.objects.inc(), i)
+            self.assertFalse(Counter.objects.filter(value__gt=0).exists())
+            Counter.objects.flush()
+            self.assertEqual(
+                Counter.objects.aggregate(total=Sum('value'))['total'], 3)
+            self.assertEqual(Counter.objects.get_current_value(), 3)
+
+    @override_settings(COUNTER_SHARDS=1)
+    def test3(self):
+        """ Lecturas e incrementos sin sumar las filas """
+        Counter.objects.inc()
+        with self.assertNumQueries(0):
+            self.assertEqual(Counter.objects.get_current_value(), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(Counter.objects.inc(), 2)
+        cache.delete(COUNTER_CACHE_KEY)
+        self.assertEqual(Counter.objects.get_current_value(), 2)
+
+
 class AdditionalShowGameServiceTest(PlayGameBaseServiceTests):
     def setUp(self):
         super().setUp()
@@ -93,6 +419,231 @@ class AdditionalShowGameServiceTest(PlayGameBaseServiceTests):
         response = self.client1.get(reverse(SHOW_GAME_SERVICE), follow=True)
         self.is_select_game(response)
 
+    @override_settings(BOARD_LRU_SIZE=1, BOARD_CACHE_TIMEOUT=60)
+    def test3(self):
+        """ El tablero se genera una vez por posición """
+        game = Game.objects.create(cat_user=self.user1,
+                                   mouse_user=self.user2)
+        other = Game.objects.create(cat_user=self.user2,
+                                    mouse_user=self.user1)
+        boards.clear()
+        cache.delete(boards.BOARD_CACHE_KEY % boards.position_key(game))
+        with mock.patch('logic.boards.render_to_string',
+                        wraps=boards.render_to_string) as render:
+            self.set_game_in_session(self.client1, self.user1, game.id)
+            response = self.client1.get(reverse(SHOW_GAME_SERVICE))
+            self.is_play_game(response, game)
+            self.set_game_in_session(self.client1, self.user1, other.id)
+            response = self.client1.get(reverse(SHOW_GAME_SERVICE))
+            self.is_play_game(response, other)
+            self.assertEqual(render.call_count, 1)
+            # Otra posición desplaza a la primera de la LRU del proceso,
+            # que vuelve a salir de la caché de Django
+            game.mouse, game.cat_turn = 61, True
+            game.save()
+            self.assertIn('cell_61', boards.render_board(game))
+            self.assertEqual(render.call_count, 2)
+            self.assertIn(boards.render_board(other),
+                          self.decode(response.content))
+            self.assertEqual(render.call_count, 2)
+
+
+class AdditionalSelectGameServiceTest(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+
+    def test1(self):
+        """ Listado de juegos paginado por id """
+        games = [Game.objects.create(cat_user=self.user1,
+                                     mouse_user=self.user2)
+                 for _ in range(5)]
+        self.loginTestUser(self.client1, self.user1)
+        with mock.patch.object(constants, 'GAMES_PAGE_SIZE', 2):
+            response = self.client1.get(reverse(SELECT_GAME_SERVICE))
+            self.assertEqual([g.id for g in response.context['as_cat']],
+                             [games[4].id, games[3].id])
+            self.assertEqual(response.context['cat_next'], games[3].id)
+            response = self.client1.get(
+                reverse(SELECT_GAME_SERVICE) +
+                '?cat_before=%d' % games[2].id)
+            self.is_select_game(response)
+            self.assertEqual([g.id for g in response.context['as_cat']],
+                             [games[1].id, games[0].id])
+            self.assertIsNone(response.context['cat_next'])
+            self.assertIn(str(games[0]), self.decode(response.content))
+
+    def test2(self):
+        """ Selección de juego con una única consulta """
+        game = Game.objects.create(cat_user=self.user1, mouse_user=self.user2)
+        self.assertTrue(Game.objects.is_playing(self.user2, game.id))
+        self.assertFalse(Game.objects.is_playing(self.user2, game.id + 1))
+        with self.assertNumQueries(1):
+            self.assertTrue(Game.objects.is_playing(self.user1, game.id))
+
+
+class AdditionalHistoryServiceTest(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(cat_user=self.user1,
+                                        mouse_user=self.user2)
+        moves = [(self.user1, 0, 9), (self.user2, 59, 50),
+                 (self.user1, 2, 11), (self.user2, 50, 43),
+                 (self.user1, 4, 13)]
+        for player, origin, target in moves:
+            Move.objects.create(game=self.game, player=player,
+                                origin=origin, target=target)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def test1(self):
+        """ Número de jugada consecutivo y páginas del historial """
+        self.assertEqual([m.ply for m in self.game.moves], [1, 2, 3, 4, 5])
+        page = Move.objects.history(self.game, size=2)
+        self.assertEqual([m.ply for m in page], [4, 5])
+        page = Move.objects.history(self.game, before=page[0].ply, size=2)
+        self.assertEqual([m.ply for m in page], [2, 3])
+        page = Move.objects.history(self.game.id, after=3, size=10)
+        self.assertEqual([(m.origin, m.target) for m in page],
+                         [(50, 43), (4, 13)])
+
+    def test2(self):
+        """ Historial en JSON con cursores de página """
+        url = reverse('move_history', kwargs={'game_id': self.game.id})
+        self.loginTestUser(self.client1, self.user1)
+        with mock.patch.object(constants, 'HISTORY_PAGE_SIZE', 2):
+            data = self.client1.get(url).json()
+            self.assertEqual(data['moves'][-1], {'ply': 5, 'origin': 4,
+                                                 'target': 13, 'cat': True})
+            self.assertEqual((data['before'], data['after']), (4, None))
+            data = self.client1.get(url + '?before=2').json()
+            self.assertEqual([m['ply'] for m in data['moves']], [1])
+            self.assertEqual((data['before'], data['after']), (None, 1))
+
+    def test3(self):
+        """ Historial de un juego ajeno """
+        game = Game.objects.create(cat_user=self.user2)
+        self.loginTestUser(self.client1, self.user1)
+        response = self.client1.get(
+            reverse('move_history', kwargs={'game_id': game.id}))
+        self.assertEqual(response.status_code, 404)
+
+
+class AdditionalCleanDbServiceTest(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        old = timezone.now() - datetime.timedelta(days=60)
+        self.removed = [Game.objects.create(cat_user=self.user1),
+                        Game.objects.create(cat_user=self.user2),
+                        Game.objects.create(cat_user=self.user1,
+                                            mouse_user=self.user2)]
+        played = Game.objects.create(cat_user=self.user1,
+                                     mouse_user=self.user2)
+        Move.objects.create(game=played, player=self.user1, origin=0,
+                            target=9)
+        finished = Game.objects.create(cat_user=self.user1,
+                                       mouse_user=self.user2,
+                                       status=GameStatus.FINISHED)
+        Game.objects.filter(id__in=[g.id for g in self.removed] +
+                            [played.id, finished.id]).update(created=old)
+        self.kept = [Game.objects.create(cat_user=self.user1), played,
+                     finished]
+
+    def tearDown(self):
+        super().tearDown()
+
+    def test1(self):
+        """ Borrado por lotes de juegos huérfanos """
+        self.assertEqual(cleanup.orphan_games().count(), 3)
+        self.assertEqual(cleanup.clean_db(size=1), 3)
+        self.assertEqual(set(Game.objects.all()), set(self.kept))
+        self.assertEqual(cleanup.clean_db(), 0)
+
+    def test2(self):
+        """ Servicio de borrado para administradores """
+        self.loginTestUser(self.client1, self.user1)
+        response = self.client1.post(reverse('clean_db'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Game.objects.count(), 6)
+
+        self.user1.is_staff = True
+        self.user1.save()
+        self.loginTestUser(self.client1, self.user1)
+        response = self.client1.get(reverse('clean_db'))
+        self.assertIn('<b>3</b> orphan games', self.decode(response.content))
+        response = self.client1.post(reverse('clean_db'), follow=True)
+        self.is_clean_db(response, 3)
+        self.assertEqual(Game.objects.count(), 3)
+
+    def test3(self):
+        """ Un juego al que alguien se une durante el borrado se conserva """
+        orphan_games = cleanup.orphan_games
+        joined = self.removed[1]
+        Game.objects.filter(id=joined.id).update(
+            created=timezone.now() - datetime.timedelta(days=10))
+
+        def join_meanwhile(*args):
+            # Segunda consulta: la del DELETE
+            if join_meanwhile.calls == 1:
+                Game.objects.join_pending(self.user1)
+            join_meanwhile.calls += 1
+            return orphan_games(*args)
+        join_meanwhile.calls = 0
+        with mock.patch('datamodel.cleanup.orphan_games',
+                        side_effect=join_meanwhile):
+            self.assertEqual(cleanup.clean_batch(joined.id, 1), 0)
+        game = Game.objects.get(id=joined.id)
+        self.assertEqual(game.status, GameStatus.ACTIVE)
+        self.assertEqual(UserStats.objects.get(user=self.user1).active_games,
+                         Game.objects.filter(status=GameStatus.ACTIVE)
+                                     .filter(Q(cat_user=self.user1) |
+                                             Q(mouse_user=self.user1))
+                                     .count())
+
+
+    def test4(self):
+        """ Borrado limitado a unos pocos lotes por petición """
+        self.assertEqual(cleanup.clean_db(size=1, batches=2), 2)
+        self.assertEqual(set(cleanup.orphan_games()), {self.removed[2]})
+        self.user1.is_staff = True
+        self.user1.save()
+        self.loginTestUser(self.client1, self.user1)
+        response = self.client1.post(reverse('clean_db'), follow=True)
+        self.is_clean_db(response, 1)
+        self.assertIn('<b>0</b> orphan games', self.decode(response.content))
+        self.assertEqual(set(Game.objects.all()), set(self.kept))
+
+class AdditionalLeaderboardServiceTest(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        cache.delete(LEADERBOARD_CACHE_KEY)
+        game = Game.objects.create(cat_user=self.user1,
+                                   mouse_user=self.user2)
+        game.cat1, game.cat2, game.cat3, game.cat4 = 45, 47, 61, 52
+        game.mouse = 63
+        game.save()
+        Move.objects.create(game=game, player=self.user1, origin=45,
+                            target=54)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def test1(self):
+        """ Clasificación por puntuación y posición del usuario """
+        response = self.client1.get(reverse('leaderboard'))
+        self.assertEqual(response.status_code, 200)
+        content = self.decode(response.content)
+        self.assertNotIn('Your rating', content)
+        self.assertLess(content.index(self.user1.username),
+                        content.index(self.user2.username))
+        self.loginTestUser(self.client1, self.user2)
+        response = self.client1.get(reverse('leaderboard'))
+        self.assertIn('Your rating: <b>1184</b> (rank <b>2</b>)',
+                      self.decode(response.content))
+
 
 class AdditionalSignupServiceTest(ServiceBaseTest):
     def setUp(self):
@@ -186,3 +737,38 @@ class AdditionalMoveServiceTests(PlayGameBaseServiceTests):
             game_t1 = Game.objects.get(id=game_t0.id)
             self.assertEqual(str(game_t0), str(game_t1))
             game_t0 = game_t1
+
+    def test2(self):
+        """ Reintento de un movimiento con la misma clave """
+        game = Game.objects.create(cat_user=self.user1,
+                                   mouse_user=self.user2,
+                                   status=GameStatus.ACTIVE)
+        self.set_game_in_session(self.client1, self.user1, game.id)
+        move = {"origin": 0, "target": 9, "token": "retry-key"}
+        for _ in range(2):
+            response = self.client1.post(reverse(MOVE_SERVICE), move,
+                                         follow=True)
+            self.is_play_game(response, Game.objects.get(id=game.id))
+        self.assertEqual(game.moves.count(), 1)
+        self.assertEqual(game.moves.get().token, "retry-key")
+
+        with self.assertRaisesRegex(ValidationError, MSG_ERROR_MOVE_CONFLICT):
+            game.refresh_from_db()
+            Move.objects.create(game=game, player=self.user2, origin=59,
+                                target=50, token="retry-key")
+            Move.objects.create(game=game, player=self.user1, origin=2,
+                                target=11, token="retry-key")
+        self.assertEqual(game.moves.count(), 2)
+
+    def test3(self):
+        """ Movimiento en un juego borrado tras seleccionarlo """
+        game = Game.objects.create(cat_user=self.user1,
+                                   mouse_user=self.user2,
+                                   status=GameStatus.ACTIVE)
+        self.set_game_in_session(self.client1, self.user1, game.id)
+        game.delete()
+        response = self.client1.post(reverse(MOVE_SERVICE),
+                                     {"origin": 0, "target": 9})
+        self.assertRedirects(response, reverse('select_game'),
+                             fetch_redirect_response=False)
+        self.assertEqual(Move.objects.count(), 0)
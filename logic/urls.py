@@ -17,4 +17,7 @@ urlpatterns = [
     path('select_game/<int:game_id>', views.select_game, name='select_game'),
     path('show_game', views.show_game, name='show_game'),
     path('move', views.move, name='move'),
+    path('history/<int:game_id>', views.move_history, name='move_history'),
+    path('clean_db', views.clean_db, name='clean_db'),
+    path('leaderboard', views.leaderboard, name='leaderboard'),
 ]
@@ -1,12 +1,17 @@
-from django.http import HttpResponseForbidden, HttpResponse
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponseForbidden, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, reverse
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from logic import boards
 from logic.forms import UserForm, SignupForm, MoveForm
-from datamodel import constants
-from datamodel.models import Counter, Game, GameStatus, Move
+from datamodel import bots, cleanup, constants
+from datamodel.models import ArchivedGame, Counter, Game, Move, UserStats
 from django.db.models import Q
 
 
@@ -234,8 +239,7 @@ def counter(request):
     Description:
             It updates and shows several counters of the received requests
     """
-    Counter.objects.inc()
-    counter_global = Counter.objects.get_current_value()
+    counter_global = Counter.objects.inc()
 
     if not request.session.get(constants.COUNTER_SESSION_ID):
         request.session[constants.COUNTER_SESSION_ID] = 1
@@ -287,22 +291,26 @@ def join_game(request):
         None
     ----------
     Description:
-        The selected game is activated and it's the player 1 turn.
+        The selected game is activated and it's the player 1 turn. The
+        newest open game is claimed atomically, so two players never join
+        the same game.
         It both cases the user is required to be logged.
     """
-    pending_games = Game.objects.filter(mouse_user=None)
-    pending_games = pending_games.exclude(cat_user=request.user)
-    pending_games = pending_games.order_by('-id')
-    if len(pending_games) == 0:
+    game = Game.objects.join_pending(request.user)
+    if game is None:
         context_dict = {constants.ERROR_MESSAGE_ID:
                         'There is no available games'}
         return render(request, "mouse_cat/join_game.html", context_dict)
-    game = pending_games[0]
-    game.mouse_user = request.user
-    game.save()
     return render(request, "mouse_cat/join_game.html", {'game': game})
 
 
+def _get_cursor(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+
 @login_required
 def select_game(request, game_id=None):
     """
@@ -323,23 +331,26 @@ def select_game(request, game_id=None):
             Once one game is selected (from the list of available games). its
         ID is stored into a variable called 'game_selected'
             It both cases the user is required to be logged.
+            Games are listed newest first, GAMES_PAGE_SIZE per role; the
+        'cat_before' and 'mouse_before' GET parameters hold the id where
+        the next page of each list starts.
     """
     if game_id:
-        my_games = Game.objects.filter(Q(cat_user=request.user) |
-                                       Q(mouse_user=request.user))
-        my_games = list(my_games.filter(status=GameStatus.ACTIVE))
-        my_games = [game.id for game in my_games]
-        if game_id in my_games:
+        if Game.objects.is_playing(request.user, game_id):
             request.session[constants.GAME_SELECTED_SESSION_ID] = int(game_id)
             return redirect(reverse('show_game'))
         else:
             return HttpResponse('Selected game does not exist.', status=404)
     # GET
-    as_cat = list(Game.objects.filter(cat_user=request.user,
-                                      status=GameStatus.ACTIVE))
-    as_mouse = list(Game.objects.filter(mouse_user=request.user,
-                                        status=GameStatus.ACTIVE))
-    context_dict = {'as_cat': as_cat, 'as_mouse': as_mouse}
+    cat_before = _get_cursor(request, 'cat_before')
+    mouse_before = _get_cursor(request, 'mouse_before')
+    as_cat, cat_next = Game.objects.active_page(
+        request.user, True, cat_before, constants.GAMES_PAGE_SIZE)
+    as_mouse, mouse_next = Game.objects.active_page(
+        request.user, False, mouse_before, constants.GAMES_PAGE_SIZE)
+    context_dict = {'as_cat': as_cat, 'as_mouse': as_mouse,
+                    'cat_before': cat_before, 'mouse_before': mouse_before,
+                    'cat_next': cat_next, 'mouse_next': mouse_next}
     return render(request, "mouse_cat/select_game.html", context_dict)
 
 
@@ -362,7 +373,8 @@ def show_game(request):
     Description:
             It shows the selected game data, including the game board,
         represented as an integer array [0,63]. Cats are represented with
-        value 1 and mouse with value -1.
+        value 1 and mouse with value -1. The board HTML is rendered once per
+        position and cached, see logic.boards.
             User is required to be logged.
     """
     if not request.session.get(constants.GAME_SELECTED_SESSION_ID):
@@ -374,11 +386,8 @@ def show_game(request):
     except Game.DoesNotExist:
         return redirect(reverse('select_game'))
 
-    board = [0]*constants.BOARD_SIZE
-    board[game.mouse] = -1
-    for i in game._get_cat_places():
-        board[i] = 1
-    context_dict = {'board': board, 'game': game, 'move_form': MoveForm()}
+    context_dict = {'board': boards.render_board(game), 'game': game,
+                    'move_form': MoveForm(initial={'token': uuid.uuid4().hex})}
     return render(request, "mouse_cat/game.html", context_dict)
 
 
@@ -394,14 +403,20 @@ def move(request):
             target can be found at the POST body parameters.
     ----------
     Returns:
-        It renders "mouse_cat/show_game.html" template; or Error 404 if an
-        invalid method is used.
+        It renders "mouse_cat/show_game.html" template; redirects to
+        "select_game" if the selected game no longer exists; or Error 404
+        if an invalid method is used.
     ----------
     Raises:
         None
     ----------
     Description:
-        It develops a movement of a given player in the selected game.
+        It develops a movement of a given player in the selected game. If
+        the opponent is a computer player, its reply is played right away
+        within the bot time budget.
+        A POST whose 'token' was already used by a saved move of the player
+        is a retry: it answers like the original move, without validating
+        or writing anything again.
         User is required to be logged.
     """
     if request.method == 'GET':
@@ -410,20 +425,140 @@ def move(request):
     if not request.session.get(constants.GAME_SELECTED_SESSION_ID):
         return HttpResponse('Invalid method.', status=404)
     game_id = request.session.get(constants.GAME_SELECTED_SESSION_ID)
-    game = Game.objects.get(id=game_id)
+
+    # A retry of a move that was already played
+    token = (request.POST.get('token') or '')[:64] or None
+    if Move.objects.replayed(request.user, token) is not None:
+        return redirect(reverse('show_game'))
+    try:
+        game = Game.objects.get(id=game_id)
+    except Game.DoesNotExist:
+        # Archived or cleaned up since it was selected
+        return redirect(reverse('select_game'))
 
     origin = int(request.POST.get('origin'))
     target = int(request.POST.get('target'))
     move_form = MoveForm(data=request.POST)
-    move = Move(origin=origin, target=target, game=game, player=request.user)
+    move = Move(origin=origin, target=target, game=game, player=request.user,
+                token=token)
     try:
         move.save()
     except ValidationError as err:
+        if err.code == 'conflict' and\
+           Move.objects.replayed(request.user, token) is not None:
+            return redirect(reverse('show_game'))
         move_form.add_error('origin', err.messages[0])
-        board = [0]*constants.BOARD_SIZE
-        board[game.mouse] = -1
-        for i in game._get_cat_places():
-            board[i] = 1
-        context_dict = {'board': board, 'game': game, 'move_form': move_form}
+        if err.code == 'conflict':
+            try:
+                game = Game.objects.get(id=game_id)
+            except Game.DoesNotExist:
+                return redirect(reverse('select_game'))
+        context_dict = {'board': boards.render_board(game), 'game': game,
+                        'move_form': move_form}
         return render(request, "mouse_cat/game.html", context_dict)
+    bots.reply(game)
     return redirect(reverse('show_game'))
+
+
+@login_required
+def move_history(request, game_id):
+    """
+    move_history
+    ----------
+    Input parameters:
+        request: received request. The optional GET parameters 'before'
+            and 'after' are ply numbers where the page starts.
+        game_id: ID of a game of the logged user.
+    ----------
+    Returns:
+            JSON with the moves of the page, in play order, and the 'before'
+        and 'after' cursors of the previous and next pages (null at either
+        end); or Error 404 if the user does not play the game.
+    ----------
+    Raises:
+        None
+    ----------
+    Description:
+            Pages through the moves of a game by ply, the latest
+        HISTORY_PAGE_SIZE moves by default, without reading the rest.
+        Archived games are served from the archive.
+            User is required to be logged.
+    """
+    players = Q(cat_user=request.user) | Q(mouse_user=request.user)
+    game = Game.objects.filter(players, id=game_id)\
+                       .only('id', 'cat_user', 'move_log').first()
+    if game is None:
+        game = ArchivedGame.objects.filter(players, id=game_id).first()
+    if game is None:
+        return HttpResponse('Selected game does not exist.', status=404)
+    moves = Move.objects.history(game, before=_get_cursor(request, 'before'),
+                                 after=_get_cursor(request, 'after'),
+                                 size=constants.HISTORY_PAGE_SIZE)
+    n_plies = len(game.move_log)
+    return JsonResponse({
+        'game': game.id,
+        'moves': [{'ply': move.ply, 'origin': move.origin,
+                   'target': move.target,
+                   'cat': move.player_id == game.cat_user_id}
+                  for move in moves],
+        'before': moves[0].ply if moves and moves[0].ply > 1 else None,
+        'after': moves[-1].ply if moves and moves[-1].ply < n_plies
+        else None,
+    })
+
+
+@staff_member_required
+def clean_db(request):
+    """
+    clean_db
+    ----------
+    Input parameters:
+        request: received request of a staff user.
+    ----------
+    Returns:
+        It renders "mouse_cat/clean_db.html" template
+    ----------
+    Raises:
+        None
+    ----------
+    Description:
+            Case method 'GET': It shows how many orphan games there are.
+            Case method 'POST': It deletes them in batches by id range, see
+        datamodel.cleanup, up to CLEAN_DB_BATCHES batches per request, and
+        shows how many games were removed and how many orphans are left.
+        The clean_db command removes them all at once.
+            Staff user is required.
+    """
+    context_dict = {}
+    if request.method == 'POST':
+        context_dict['n_games_delete'] = cleanup.clean_db(
+            batches=constants.CLEAN_DB_BATCHES)
+    context_dict['n_orphans'] = cleanup.orphan_games().count()
+    return render(request, "mouse_cat/clean_db.html", context_dict)
+
+
+def leaderboard(request):
+    """
+    leaderboard
+    ----------
+    Input parameters:
+        request: received request. It also contains the user.
+    ----------
+    Returns:
+        It renders "mouse_cat/leaderboard.html" template
+    ----------
+    Raises:
+        None
+    ----------
+    Description:
+            It shows the best rated players, from a list cached for a few
+        seconds (see UserStatsManager.leaderboard), and, for a logged
+        user, their own rating and rank.
+    """
+    context_dict = {'players': UserStats.objects.leaderboard()}
+    if request.user.is_authenticated:
+        stats = UserStats.objects.filter(user=request.user).first()
+        context_dict['rating'] = round(stats.rating) if stats else\
+            round(settings.ELO_INITIAL_RATING)
+        context_dict['rank'] = UserStats.objects.rank(request.user)
+    return render(request, "mouse_cat/leaderboard.html", context_dict)
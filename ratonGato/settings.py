@@ -138,6 +138,38 @@ USE_L10N = True
 USE_TZ = True
 
 
+# Solved game table, generated with 'manage.py solve_tablebase'
+TABLEBASE_PATH = os.getenv('TABLEBASE_PATH',
+                           os.path.join(BASE_DIR, 'tablebase.bin'))
+
+# Computer players: username -> engine (see datamodel.bots.ENGINES)
+MOUSE_CAT_BOTS = {
+    'bot_alphabeta': 'alphabeta',
+    'bot_mcts': 'mcts',
+}
+# Hard time budget for a bot reply, in seconds
+BOT_MOVE_TIME = float(os.getenv('BOT_MOVE_TIME', 0.1))
+# Processes running MCTS rollouts (all cores when unset)
+MCTS_WORKERS = int(os.getenv('MCTS_WORKERS', 0)) or None
+
+# Global request counter: number of shard rows, seconds the total is
+# cached, and seconds between write-behind flushes (0 disables buffering)
+COUNTER_SHARDS = int(os.getenv('COUNTER_SHARDS', 16))
+COUNTER_CACHE_TIMEOUT = int(os.getenv('COUNTER_CACHE_TIMEOUT', 5))
+COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', 0))
+
+# Elo ratings: rating of new players and K factor of each update
+ELO_INITIAL_RATING = 1200.0
+ELO_K_FACTOR = float(os.getenv('ELO_K_FACTOR', 32))
+# Leaderboard: players shown and seconds it may be out of date
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', 20))
+LEADERBOARD_CACHE_TIMEOUT = int(os.getenv('LEADERBOARD_CACHE_TIMEOUT', 60))
+
+# Rendered game boards: positions kept per process, and seconds they are
+# also kept in the shared Django cache (0 disables it)
+BOARD_LRU_SIZE = int(os.getenv('BOARD_LRU_SIZE', 4096))
+BOARD_CACHE_TIMEOUT = int(os.getenv('BOARD_CACHE_TIMEOUT', 0))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 LOGIN_URL = 'login'